@@ -0,0 +1,336 @@
+"""Turn free-text car requests into ReCarmend search filters.
+
+Prompts go through three steps:
+
+1. an LRU cache (with a TTL) of already parsed prompts, keyed on the
+   normalized prompt text;
+2. a deterministic local parser that handles prompts made only of things it
+   recognizes (colors, makes and models from the scraped listings, body
+   types, "under 10000", "less than 80,000 km", "2015 or newer", ...);
+3. the Cohere model, called through one pooled async client, with identical
+   prompts in flight at the same time sharing one request.
+
+Filters use ListingStore.search's keyword names. Many prompts can be parsed
+concurrently with AsyncQueryParser.parse_many. Set CO_API_URL to point the
+client at a local stand-in for the Cohere API (see cohere_stub.py).
+
+    python ai_search.py "red Honda Civic under 10000" "a roomy family car for winter"
+"""
+import argparse
+import asyncio
+import os
+import re
+import time
+from collections import Counter, OrderedDict, namedtuple
+
+MODEL = "command-a-03-2025"
+CURRENT_YEAR = 2026
+
+CAR_TYPES = ["Convertible", "Coupe", "Hatchback", "Hybrid", "Sedan", "SUV", "Minivan", "Pickup Truck"]
+
+# Fixed instructions, sent as the system message so every request shares the same prefix
+PARSE_INSTRUCTIONS = (
+    "Isolate the desired model, make, year range, maximum price, color, maximum mileage and car type from "
+    "the user's prompt. If the prompt does not relate to cars, reply with nothing more than: this prompt "
+    "does not relate to cars. Only give a color if it is a very general color (red, orange, yellow, green, "
+    "blue, black, white, silver; NOT matte black or platinum silver), otherwise return null. If the prompt "
+    "has no information for Color, Make, Model or Car type, return 'null' for it. If multiple makes are "
+    "given, select only one. Possible car types are " + ", ".join(CAR_TYPES) + "; if none of these is "
+    "specified return null. If there is no information for Maximum Price, Maximum Mileage or Minimum/Maximum "
+    f"Year, return 0. The current year is {CURRENT_YEAR}. Do not include any additional text. Format the "
+    "output as one field per line:\n"
+    "Maximum Price:\nMaximum Mileage:\nCar type:\nColor:\nMake:\nModel:\nMinimum Year:\nMaximum Year:"
+)
+
+# Model output label -> ListingStore.search keyword
+RESPONSE_FIELDS = {
+    "Maximum Price": "max_price",
+    "Maximum Mileage": "max_mileage",
+    "Car type": "car_type",
+    "Color": "color",
+    "Make": "make",
+    "Model": "model",
+    "Minimum Year": "min_year",
+    "Maximum Year": "max_year",
+}
+FILTER_NAMES = list(RESPONSE_FIELDS.values())
+
+ParsedQuery = namedtuple("ParsedQuery", ["filters", "source", "raw_text"])
+
+
+def empty_filters():
+    return dict.fromkeys(FILTER_NAMES)
+
+
+def normalize_prompt(prompt):
+    """Cache key for a prompt: lowercase, single spaces, no trailing punctuation."""
+    return " ".join(prompt.lower().split()).strip(" .!?")
+
+
+def parse_model_response(text):
+    """Read the "Label: value" lines of a model response into a filters dict."""
+    filters = empty_filters()
+    for line in text.splitlines():
+        label, sep, value = line.partition(":")
+        name = RESPONSE_FIELDS.get(label.strip())
+        if sep and name:
+            filters[name] = value.strip()
+    return filters
+
+
+class TTLCache:
+    """Least-recently-used cache whose entries also expire after ttl seconds."""
+
+    def __init__(self, maxsize=1024, ttl=3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def set(self, key, value):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+
+# Words that carry no filter, so the local parser can skip them
+FILLER_WORDS = {
+    "a", "an", "the", "i", "im", "i'm", "me", "my", "we", "want", "need", "looking", "look", "for", "with",
+    "and", "or", "car", "cars", "vehicle", "vehicles", "show", "find", "get", "give", "in", "that", "is",
+    "of", "some", "any", "please", "used", "new", "one", "like", "would", "to", "buy", "de", "price",
+    "priced", "costing", "budget", "around", "than", "km", "kms", "mileage", "year", "model",
+}
+COLOR_WORDS = {
+    "black": "black", "white": "white", "red": "red", "blue": "blue", "green": "green", "yellow": "yellow",
+    "orange": "orange", "purple": "purple", "pink": "pink", "brown": "brown", "beige": "beige",
+    "gray": "gray", "grey": "gray", "silver": "silver", "gold": "gold",
+}
+CAR_TYPE_WORDS = {
+    "convertible": "Convertible", "convertibles": "Convertible", "coupe": "Coupe", "coupes": "Coupe",
+    "hatchback": "Hatchback", "hatchbacks": "Hatchback", "hybrid": "Hybrid", "hybrids": "Hybrid",
+    "sedan": "Sedan", "sedans": "Sedan", "suv": "SUV", "suvs": "SUV", "minivan": "Minivan",
+    "minivans": "Minivan", "van": "Minivan", "pickup": "Pickup Truck", "pickups": "Pickup Truck",
+    "truck": "Pickup Truck", "trucks": "Pickup Truck",
+}
+
+YEAR = r"(19[5-9]\d|20[0-4]\d)"
+NUMBER = r"\$?(\d[\d,]*(?:\.\d+)?)\s*(k)?"
+DISTANCE_UNIT = r"\s*(?:km|kms|kilometers|kilometres|miles|mi)\b"
+UPPER_BOUND = r"(?:under|below|less than|at most|max(?:imum)?|up to|no more than|<)\s*"
+
+# Each pattern consumes its part of the prompt; the order matters (mileage before price)
+MILEAGE_RE = re.compile(UPPER_BOUND + NUMBER + DISTANCE_UNIT)
+YEAR_RANGE_RE = re.compile(r"(?:from\s*|between\s*)?\b" + YEAR + r"\s*(?:-|to|and)\s*" + YEAR + r"\b")
+MIN_YEAR_RE = re.compile(r"(?:(?:newer than|after|since|from)\s*\b" + YEAR + r"\b|\b" + YEAR
+                         + r"\s*(?:or|and)\s*(?:newer|later|up)\b|\b" + YEAR + r"\s*\+)")
+MAX_YEAR_RE = re.compile(r"(?:older than|before)\s*\b" + YEAR + r"\b|\b" + YEAR + r"\s*(?:or|and)\s*older\b")
+PRICE_RE = re.compile(UPPER_BOUND + NUMBER + r"(?:\s*(?:\$|dollars|bucks|cad))?(?![\d,])"
+                      r"|\$(\d[\d,]*(?:\.\d+)?)\s*(k)?")
+SINGLE_YEAR_RE = re.compile(r"\b" + YEAR + r"\b")
+
+
+def number_value(digits, thousands):
+    value = float(digits.replace(",", ""))
+    return int(value * 1000) if thousands else int(value)
+
+
+class LocalQueryParser:
+    """Deterministic parser for prompts made only of words and phrases it recognizes.
+
+    vocabulary is a pair of iterables (makes, models), normally the labels of
+    the scraped listings. parse() returns None when anything in the prompt is
+    left over, so the prompt goes to the model instead; strict=False ignores
+    the leftovers (used by the local Cohere stand-in).
+    """
+
+    def __init__(self, vocabulary=None):
+        makes, models = vocabulary or ((), ())
+        self.makes = self._words(makes)
+        self.models = self._words(models)
+
+    @staticmethod
+    def _words(labels):
+        # Single letters, bare numbers ("Mazda 3") and filler words are too ambiguous to match locally
+        return {label.lower(): label for label in labels
+                if len(label) > 1 and not label.isdigit() and label.lower() not in FILLER_WORDS}
+
+    def parse(self, prompt, strict=True):
+        text = normalize_prompt(prompt)
+        filters = empty_filters()
+
+        def take(pattern, handle):
+            nonlocal text
+            match = pattern.search(text)
+            if match:
+                handle([group for group in match.groups()])
+                text = text[:match.start()] + " " + text[match.end():]
+
+        def mileage(groups):
+            filters["max_mileage"] = number_value(groups[0], groups[1])
+
+        def year_range(groups):
+            filters["min_year"], filters["max_year"] = sorted(int(year) for year in groups)
+
+        def min_year(groups):
+            filters["min_year"] = int(next(year for year in groups if year))
+
+        def max_year(groups):
+            before = groups[0] is not None
+            filters["max_year"] = int(groups[0]) - 1 if before else int(groups[1])
+
+        def price(groups):
+            digits, thousands = (groups[0], groups[1]) if groups[0] else (groups[2], groups[3])
+            filters["max_price"] = number_value(digits, thousands)
+
+        def single_year(groups):
+            filters["min_year"] = filters["max_year"] = int(groups[0])
+
+        take(MILEAGE_RE, mileage)
+        take(YEAR_RANGE_RE, year_range)
+        take(MIN_YEAR_RE, min_year)
+        take(MAX_YEAR_RE, max_year)
+        take(PRICE_RE, price)
+        if filters["min_year"] is None and filters["max_year"] is None:
+            take(SINGLE_YEAR_RE, single_year)
+
+        text = text.replace("pickup truck", "pickup").replace("pick up truck", "pickup")
+        leftovers = []
+        for word in re.findall(r"[\w'-]+", text):
+            if word in COLOR_WORDS and filters["color"] is None:
+                filters["color"] = COLOR_WORDS[word]
+            elif word in CAR_TYPE_WORDS and filters["car_type"] is None:
+                filters["car_type"] = CAR_TYPE_WORDS[word]
+            elif word in self.makes and filters["make"] is None:
+                filters["make"] = self.makes[word]
+            elif word in self.models and filters["model"] is None:
+                filters["model"] = self.models[word]
+            elif word not in FILLER_WORDS:
+                leftovers.append(word)
+
+        if strict and leftovers:
+            return None
+        if all(value is None for value in filters.values()):
+            return None
+        return filters
+
+
+class AsyncQueryParser:
+    """Cached, concurrent prompt -> filters parsing (cache, then local parser, then the model).
+
+    One cohere.AsyncClientV2 (with one pooled httpx.AsyncClient) is created on
+    the first prompt that needs the model and reused for every later one;
+    max_concurrency caps the requests to the API at any one time.
+    """
+
+    def __init__(self, vocabulary=None, client=None, model=MODEL, cache_size=1024, ttl=3600, max_concurrency=8):
+        self.local = LocalQueryParser(vocabulary)
+        self.model = model
+        self.cache = TTLCache(cache_size, ttl)
+        self.max_concurrency = max_concurrency
+        self.stats = Counter()
+        self._client = client
+        self._http = None
+        self._semaphore = None
+        self._inflight = {}
+
+    @property
+    def client(self):
+        if self._client is None:
+            import cohere
+            import httpx
+
+            self._http = httpx.AsyncClient(limits=httpx.Limits(max_connections=self.max_concurrency), timeout=60)
+            self._client = cohere.AsyncClientV2(os.getenv("CO_API_KEY"), httpx_client=self._http)
+        return self._client
+
+    async def parse(self, prompt):
+        """ParsedQuery(filters, source, raw_text) for one prompt; source is "cache", "local" or "model"."""
+        key = normalize_prompt(prompt)
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.stats["cache"] += 1
+            return cached._replace(source="cache")
+
+        filters = self.local.parse(key)
+        if filters is not None:
+            self.stats["local"] += 1
+            parsed = ParsedQuery(filters, "local", None)
+            self.cache.set(key, parsed)
+            return parsed
+
+        # Identical prompts arriving together share one model request
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._ask_model(key, prompt))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.stats["shared"] += 1
+        return await task
+
+    async def _ask_model(self, key, prompt):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            self.stats["model"] += 1
+            response = await self.client.chat(
+                model=self.model,
+                messages=[{"role": "system", "content": PARSE_INSTRUCTIONS},
+                          {"role": "user", "content": prompt}],
+            )
+        raw_text = response.message.content[0].text
+        parsed = ParsedQuery(parse_model_response(raw_text), "model", raw_text)
+        self.cache.set(key, parsed)
+        return parsed
+
+    async def parse_many(self, prompts):
+        return await asyncio.gather(*(self.parse(prompt) for prompt in prompts))
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+            self._client = None
+
+
+def vocabulary_from_store(store):
+    """(makes, models) known to a ListingStore, for the local parser."""
+    return store.make.labels, store.model.labels
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parse car requests into ReCarmend filters")
+    parser.add_argument("prompts", nargs="+", help="free-text car requests, parsed concurrently")
+    parser.add_argument("--data-dir", default=os.path.dirname(os.path.abspath(__file__)),
+                        help="folder with the car_listings_*.csv files (for known makes and models)")
+    args = parser.parse_args(argv)
+
+    from listing_store import ListingStore
+
+    query_parser = AsyncQueryParser(vocabulary_from_store(ListingStore.from_csv_dir(args.data_dir)))
+
+    async def run():
+        try:
+            return await query_parser.parse_many(args.prompts)
+        finally:
+            await query_parser.aclose()
+
+    for prompt, parsed in zip(args.prompts, asyncio.run(run())):
+        print(f"{prompt!r} ({parsed.source}): {parsed.filters}")
+
+
+if __name__ == "__main__":
+    main()
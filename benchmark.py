@@ -0,0 +1,437 @@
+"""Offline benchmarks against recorded carpages.ca pages.
+
+fixtures/ holds a results category (three pages of 50 sedans, the last one
+with a disabled "→"), a captcha interstitial that redirects itself after
+1.5 s, and a homepage. They are served by a local HTTP stand-in, so crawl
+performance can be measured on any machine without touching the live site:
+
+    python benchmark.py                      # parser, CSV, memory, similarity, query service and HTTP crawl
+    python benchmark.py --browser            # also crawl the fixture site with Chrome
+    python benchmark.py --startup            # also time the startup of main.py's subcommands
+    python benchmark.py --repeat 50 --json results.json
+
+Every benchmark reports p50/p95 latency per run and items/sec throughput.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from csv_output import CsvRowSink, write_rows_to_csv
+from listing_parser import (COLOR_XPATH, LISTING_CONTAINER_XPATH, LISTING_XPATH, MILEAGE_BOX_XPATH,
+                            MILEAGE_HEADER_XPATH, PRICE_XPATH, element_text, extract_data_from_listing,
+                            find_first, listings_from_html, normalize_color)
+from listing_table import ListingTable
+from normalize import normalize_colors, normalize_rows, normalize_table
+from sites import SITES, SiteAdapter
+from telemetry import percentile
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+CATEGORY_PAGES = 3
+
+
+def fixture(name):
+    with open(os.path.join(FIXTURE_DIR, name), encoding="utf-8") as fixture_file:
+        return fixture_file.read()
+
+
+# Turns the fixture's page links into in-place AJAX pagination
+AJAX_PAGINATION_SCRIPT = """<script>
+document.addEventListener("click", async event => {
+  const link = event.target.closest("section a[href^='?page=']");
+  if (!link) return;
+  event.preventDefault();
+  const html = await (await fetch(link.getAttribute("href"))).text();
+  const next = new DOMParser().parseFromString(html, "text/html");
+  document.querySelector("section").replaceWith(next.querySelector("section"));
+});
+</script>"""
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    """Serves the fixtures under carpages.ca-like URLs.
+
+    /sedan/?page=N is results page N; /captcha-sedan/ shows the interstitial
+    first and the same results once the interstitial has redirected.
+    /ajax-sedan/ is the same category with AJAX pagination: "→" fetches the
+    next page and swaps the results section in place, keeping the URL.
+    """
+
+    latency = 0.0
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path == "/":
+            body = fixture("homepage.html")
+        elif url.path in ("/sedan/", "/captcha-sedan/", "/ajax-sedan/"):
+            if url.path == "/captcha-sedan/" and not query:
+                body = fixture("captcha.html")
+            else:
+                page = min(max(int(query.get("page", ["1"])[0]), 1), CATEGORY_PAGES)
+                body = fixture(f"sedan_page_{page}.html")
+                if url.path == "/ajax-sedan/":
+                    body = body.replace("</body>", AJAX_PAGINATION_SCRIPT + "</body>")
+        else:
+            self.send_error(404)
+            return
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass  # Keep the benchmark output readable
+
+
+@contextlib.contextmanager
+def fixture_server(latency=0.0):
+    """Run the fixture site on a free local port and yield its base URL.
+
+    latency (seconds) is added to every response to imitate the live site.
+    """
+    handler = type("Handler", (FixtureHandler,), {"latency": latency})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def run_benchmark(name, fn, repeat, items, unit):
+    """Time fn() repeat times; items is how many units one call handles."""
+    fn()  # Warm-up: imports, caches, first connection
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    result = {
+        "name": name,
+        "runs": repeat,
+        "p50_ms": round(percentile(times, 50) * 1000, 3),
+        "p95_ms": round(percentile(times, 95) * 1000, 3),
+        "throughput": round(items * repeat / sum(times), 1),
+        "unit": f"{unit}/s",
+    }
+    print(f"  {name:<32} p50={result['p50_ms']:>9.3f}ms  p95={result['p95_ms']:>9.3f}ms  "
+          f"{result['throughput']:>11,.1f} {result['unit']}")
+    return result
+
+
+def parse_page(html, base_url):
+    return [extract_data_from_listing(listing, "Sedan") for listing in listings_from_html(html, base_url)]
+
+
+class SelectorOnlySite(SiteAdapter):
+    """The fixture pages described with selectors only, so SiteAdapter's generic row extraction is exercised."""
+
+    name = "selectors"
+    homepage_url = "https://www.carpages.ca"
+    key_space = 1
+    listing_container_xpath = LISTING_CONTAINER_XPATH
+    listing_xpath = LISTING_XPATH
+    title_xpath = ".//h4"
+    price_xpath = PRICE_XPATH
+    mileage_xpath = MILEAGE_HEADER_XPATH + MILEAGE_BOX_XPATH[1:]
+    color_xpath = COLOR_XPATH
+
+
+def parser_benchmarks(repeat):
+    pages = [fixture(f"sedan_page_{n}.html") for n in range(1, CATEGORY_PAGES + 1)]
+    base_url = "https://www.carpages.ca/sedan/"
+    rows = [row for html in pages for row in parse_page(html, base_url)]
+    generic = SelectorOnlySite()
+    # A second adapter must read the same rows and still file them under its own keys
+    assert [row for html in pages for row in generic.page_rows(html, base_url, "Sedan")] == rows
+    assert generic.listing_key(rows[0]["url"]) != SITES["carpages"].listing_key(rows[0]["url"])
+    raw_colors = [element_text(find_first(listing, COLOR_XPATH))
+                  for html in pages for listing in listings_from_html(html)]
+    # A crawl-sized batch for the vectorized and CSV benchmarks
+    many_rows = rows * 100
+    many_colors = raw_colors * 100
+
+    table = ListingTable(many_rows)
+    results = [
+        run_benchmark("listings_from_html", lambda: [listings_from_html(html, base_url) for html in pages],
+                      repeat, len(pages), "pages"),
+        run_benchmark("extract rows (parse + extract)", lambda: [parse_page(html, base_url) for html in pages],
+                      repeat, len(rows), "rows"),
+        run_benchmark("  generic SiteAdapter", lambda: [generic.page_rows(html, base_url, "Sedan") for html in pages],
+                      repeat, len(rows), "rows"),
+        run_benchmark("normalize_color", lambda: [normalize_color(color) for color in many_colors],
+                      repeat, len(many_colors), "colors"),
+        run_benchmark("normalize_colors (vectorized)", lambda: normalize_colors(many_colors),
+                      repeat, len(many_colors), "colors"),
+        run_benchmark("normalize_rows", lambda: normalize_rows(many_rows, colors=False),
+                      repeat, len(many_rows), "rows"),
+        run_benchmark("normalize_table (ListingTable)", lambda: normalize_table(table),
+                      repeat, len(many_rows), "rows"),
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        def write_csv():
+            write_rows_to_csv(many_rows, os.path.join(tmp, "car_listings.csv"))
+
+        def stream_csv():
+            sink = CsvRowSink(tmp)
+            for start in range(0, len(many_rows), 50):
+                sink.write_rows(many_rows[start:start + 50])
+            sink.close()
+
+        def table_csv():
+            sink = CsvRowSink(tmp)
+            sink.write_rows(table)
+            sink.close()
+
+        results.append(run_benchmark("write_rows_to_csv", write_csv, repeat, len(many_rows), "rows"))
+        results.append(run_benchmark("CsvRowSink (page by page)", stream_csv, repeat, len(many_rows), "rows"))
+        results.append(run_benchmark("CsvRowSink (ListingTable)", table_csv, repeat, len(many_rows), "rows"))
+    return results
+
+
+def memory_benchmark(data_dir=os.path.dirname(os.path.abspath(__file__))):
+    """Memory held by the category CSVs as row dicts vs. as a ListingTable (tracemalloc), and pickled size."""
+    import csv
+    import glob
+    import pickle
+    import tracemalloc
+
+    paths = sorted(glob.glob(os.path.join(data_dir, "car_listings_*.csv")))
+    if not paths:
+        print("  (no car_listings_*.csv files, skipping the memory benchmarks)")
+        return []
+
+    def dict_rows():
+        rows = []
+        for path in paths:
+            with open(path, newline="", encoding="utf-8") as csvfile:
+                rows.extend(csv.DictReader(csvfile))
+        return rows
+
+    results = []
+    loaders = (("rows as dicts", dict_rows), ("rows as ListingTable", lambda: ListingTable.from_csv_files(paths)))
+    for name, load in loaders:
+        tracemalloc.start()
+        rows = load()
+        held, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result = {"name": name, "rows": len(rows), "bytes": held, "bytes_per_row": round(held / len(rows), 1),
+                  "peak_bytes": peak, "pickled_bytes": len(pickle.dumps(rows))}
+        print(f"  {name:<32} {result['bytes'] / 1e6:>7.2f} MB  {result['bytes_per_row']:>7.1f} B/row  "
+              f"peak {peak / 1e6:.2f} MB  pickled {result['pickled_bytes'] / 1e6:.2f} MB")
+        results.append(result)
+        del rows
+    return results
+
+
+def similarity_benchmark(repeat, data_dir=os.path.dirname(os.path.abspath(__file__))):
+    """Top-k queries against a similarity index of the category CSVs next to this file."""
+    from similarity import SimilarityIndex
+
+    index = SimilarityIndex()
+    if not index.refresh(data_dir):
+        print("  (no car_listings_*.csv files, skipping the similarity benchmarks)")
+        return []
+    queries = [index.query_for_row(row) for row in range(0, len(index), max(1, len(index) // 100))][:100]
+    return [
+        run_benchmark(f"SimilarityIndex build ({len(index)} rows)", lambda: SimilarityIndex().refresh(data_dir),
+                      repeat, len(index), "rows"),
+        run_benchmark("SimilarityIndex.nearest (k=10)", lambda: index.nearest(queries, 10),
+                      repeat, len(queries), "queries"),
+    ]
+
+
+@contextlib.contextmanager
+def recarmend_service(data_dir):
+    """Run the ReCarmend query service on a free local port in a background thread; yields its URL."""
+    import asyncio
+
+    from recarmend_server import RecarmendService
+    from similarity import INDEX_FILENAME
+
+    # Keep the service's similarity index out of data_dir (the source tree when benchmarking the sample CSVs)
+    with tempfile.TemporaryDirectory() as tmp:
+        service = RecarmendService(data_dir, os.path.join(tmp, INDEX_FILENAME))
+    loop = asyncio.new_event_loop()
+    server = loop.run_until_complete(asyncio.start_server(service.handle_connection, "127.0.0.1", 0))
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    async def shutdown():
+        # Keep-alive connections still have handlers waiting for their next request
+        server.close()
+        handlers = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in handlers:
+            task.cancel()
+        await asyncio.gather(*handlers, return_exceptions=True)
+
+    try:
+        yield f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+    finally:
+        asyncio.run_coroutine_threadsafe(shutdown(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+
+def service_benchmark(repeat, concurrency=32, data_dir=os.path.dirname(os.path.abspath(__file__))):
+    """Load-test the query service with batches of concurrent filter searches over keep-alive connections."""
+    import asyncio
+
+    import httpx
+
+    searches = [{"make": make, "maximumPrice": price, "carType": "Sedan"}
+                for make in ("Honda", "Toyota", "Ford", "Kia") for price in (8000, 15000, 25000, 40000)]
+
+    async def batch(base_url):
+        async with httpx.AsyncClient(base_url=base_url, limits=httpx.Limits(max_connections=concurrency)) as client:
+            responses = await asyncio.gather(*(client.post("/search", json=searches[i % len(searches)])
+                                               for i in range(concurrency)))
+        assert all(response.status_code == 200 for response in responses)
+        return [response.json()["latency_ms"] for response in responses]
+
+    with recarmend_service(data_dir) as base_url:
+        server_latencies = []
+        result = run_benchmark(f"recarmend_server /search x{concurrency}",
+                               lambda: server_latencies.extend(asyncio.run(batch(base_url))),
+                               repeat, concurrency, "requests")
+    result["server_p50_ms"] = percentile(server_latencies, 50)
+    result["server_p95_ms"] = percentile(server_latencies, 95)
+    print(f"  {'  in-server latency':<32} p50={result['server_p50_ms']:>9.3f}ms  p95={result['server_p95_ms']:>9.3f}ms")
+    return [result]
+
+
+# Entry points and the commands that start them, for the startup benchmark
+STARTUP_COMMANDS = [
+    ("main.py stats --help", ["main.py", "stats", "--help"]),
+    ("main.py export --help", ["main.py", "export", "--help"]),
+    ("main.py normalize --help", ["main.py", "normalize", "--help"]),
+    ("main.py crawl --help", ["main.py", "crawl", "--help"]),
+    ("import recarmend", ["-c", "import recarmend"]),
+    ("import recarmend_server", ["-c", "import recarmend_server"]),
+]
+
+
+def startup_benchmark(repeat):
+    """Wall time of starting each entry point in a fresh interpreter (imports included)."""
+    import subprocess
+    import sys
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    results = []
+    for name, args in STARTUP_COMMANDS:
+        results.append(run_benchmark(name, lambda: subprocess.run([sys.executable] + args, cwd=here, check=True,
+                                                                  stdout=subprocess.DEVNULL),
+                                     repeat, 1, "starts"))
+    return results
+
+
+def http_crawl_benchmark(base_url, repeat, prefetch=2):
+    from http_engine import create_http_client, navigate_category_http
+    from pacing import rate_limiter
+
+    rate_limiter.configure(0)
+    client = create_http_client()
+    try:
+        def crawl(depth):
+            collector = ListingTable()
+            with contextlib.redirect_stdout(io.StringIO()):
+                navigate_category_http(client, SITES["carpages"], collector, base_url + "/sedan/", prefetch=depth)
+            assert len(collector) == CATEGORY_PAGES * 50, len(collector)
+
+        return [
+            run_benchmark("navigate_category_http", lambda: crawl(0), repeat, CATEGORY_PAGES, "pages"),
+            run_benchmark(f"  with prefetch={prefetch}", lambda: crawl(prefetch), repeat, CATEGORY_PAGES, "pages"),
+        ]
+    finally:
+        client.close()
+
+
+def browser_crawl_benchmark(base_url, repeat):
+    """Crawl the fixture category with Chrome through navigate_category/navigate_page."""
+    from driver_lifecycle import DriverManager
+    from pacing import rate_limiter
+    from telemetry import histogram, metrics
+    import crawl
+
+    rate_limiter.configure(0)
+    browser = DriverManager(crawl.create_driver, keep_spare=False)
+    driver = browser.start()
+    try:
+        def crawl_fixture(path, pipeline=False, expected_rows=CATEGORY_PAGES * 50):
+            collector = ListingTable()
+            crawl.navigate_category.pipeline = pipeline
+            with contextlib.redirect_stdout(io.StringIO()):
+                driver.get(base_url + path)
+                crawl.bypass_captcha(driver, SITES["carpages"])
+                crawl.navigate_category(browser, SITES["carpages"], collector, base_url + path)
+            assert len(collector) == expected_rows, len(collector)
+
+        metrics.reset()
+        results = [
+            run_benchmark("navigate_category (browser)", lambda: crawl_fixture("/sedan/"), repeat,
+                          CATEGORY_PAGES, "pages"),
+            run_benchmark("  pipelined", lambda: crawl_fixture("/sedan/", pipeline=True), repeat,
+                          CATEGORY_PAGES, "pages"),
+            run_benchmark("captcha interstitial + crawl", lambda: crawl_fixture("/captcha-sedan/"), repeat,
+                          CATEGORY_PAGES, "pages"),
+            run_benchmark("AJAX pagination", lambda: crawl_fixture("/ajax-sedan/"), repeat,
+                          CATEGORY_PAGES, "pages"),
+        ]
+        turns = metrics.durations["page_turn"]
+        print(f"  {'page turns (s)':<32} " + "  ".join(f"{bucket}:{n}" for bucket, n in histogram(turns).items()))
+        return results
+    finally:
+        browser.quit()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the scraper against recorded carpages.ca pages")
+    parser.add_argument("--repeat", type=int, default=20, help="timed runs per benchmark")
+    parser.add_argument("--browser", action="store_true", help="also crawl the fixture site with Chrome")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="seconds of simulated network latency per fixture response")
+    parser.add_argument("--startup", action="store_true",
+                        help="also time the startup of each command line entry point")
+    parser.add_argument("--json", help="save the results to this file")
+    args = parser.parse_args(argv)
+
+    print("Parser, normalization and CSV benchmarks:")
+    results = parser_benchmarks(args.repeat)
+    print("Listing memory (category CSVs):")
+    results += memory_benchmark()
+    print("Similarity search benchmarks:")
+    results += similarity_benchmark(args.repeat)
+    print("ReCarmend query service benchmarks:")
+    results += service_benchmark(args.repeat)
+    with fixture_server(args.latency) as base_url:
+        print(f"Crawl benchmarks against {base_url}:")
+        results += http_crawl_benchmark(base_url, args.repeat)
+        if args.browser:
+            # Chrome runs are slow; a few are enough to see the per-page cost
+            results += browser_crawl_benchmark(base_url, max(1, min(args.repeat, 5)))
+
+    if args.startup:
+        print("Entry point startup (fresh interpreter, imports included):")
+        results += startup_benchmark(max(1, min(args.repeat, 10)))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as json_file:
+            json.dump(results, json_file, indent=2)
+        print(f"Saved results to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Durable crawl progress so a crashed or restarted run can pick up where it stopped.
+
+Progress lives in a SQLite file in the data folder. Every scraped page is
+committed together with its rows, so after a crash the next run replays the
+saved rows into its output, skips finished categories and jumps to the last good page of the
+category it was in the middle of.
+"""
+import os
+import sqlite3
+
+from csv_output import FIELDNAMES
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS categories (
+    category_url   TEXT PRIMARY KEY,
+    body_type      TEXT,
+    pages          INTEGER NOT NULL DEFAULT 0,
+    last_page_url  TEXT,
+    last_page_text TEXT,
+    finished       INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS rows (
+    category_url TEXT NOT NULL,
+    page         INTEGER NOT NULL,
+    year         TEXT,
+    make         TEXT,
+    model        TEXT,
+    price        TEXT,
+    mileage      INTEGER,
+    color        TEXT,
+    url          TEXT,
+    body_type    TEXT
+);
+"""
+
+
+class CrawlCheckpoint:
+    """Per-run crawl journal stored in data_dir/crawl_checkpoint.sqlite3."""
+
+    def __init__(self, data_dir, filename="crawl_checkpoint.sqlite3"):
+        self.path = os.path.join(data_dir, filename)
+        # Pool workers write to the same file, so wait on locks instead of failing
+        self.conn = sqlite3.connect(self.path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def finished_categories(self):
+        cursor = self.conn.execute("SELECT category_url FROM categories WHERE finished = 1")
+        return {url for (url,) in cursor}
+
+    def finished_body_types(self):
+        cursor = self.conn.execute(
+            "SELECT DISTINCT body_type FROM categories WHERE finished = 1 AND body_type IS NOT NULL")
+        return {body_type for (body_type,) in cursor}
+
+    def category_progress(self, category_url):
+        """Return (pages, last_page_url, last_page_text) for a partly scraped category, or None."""
+        row = self.conn.execute(
+            "SELECT pages, last_page_url, last_page_text FROM categories "
+            "WHERE category_url = ? AND finished = 0 AND pages > 0",
+            (category_url,)).fetchone()
+        return row
+
+    def record_page(self, category_url, body_type, page, page_url, page_text, rows):
+        """Commit one scraped page and its rows in a single transaction."""
+        with self.conn:
+            self.conn.executemany(
+                f"INSERT INTO rows (category_url, page, {', '.join(FIELDNAMES)}) "
+                f"VALUES (?, ?, {', '.join('?' for _ in FIELDNAMES)})",
+                [(category_url, page, *(row[f] for f in FIELDNAMES)) for row in rows])
+            self.conn.execute(
+                "INSERT INTO categories (category_url, body_type, pages, last_page_url, last_page_text) "
+                "VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(category_url) DO UPDATE SET body_type = excluded.body_type, "
+                "pages = excluded.pages, last_page_url = excluded.last_page_url, "
+                "last_page_text = excluded.last_page_text",
+                (category_url, body_type, page, page_url, page_text))
+
+    def finish_category(self, category_url):
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO categories (category_url, finished) VALUES (?, 1) "
+                "ON CONFLICT(category_url) DO UPDATE SET finished = 1",
+                (category_url,))
+
+    def load_rows(self, sink, batch_size=1000):
+        """Replay rows saved by an earlier, unfinished run into sink. Returns how many were loaded."""
+        cursor = self.conn.execute(f"SELECT {', '.join(FIELDNAMES)} FROM rows ORDER BY rowid")
+        count = 0
+        while True:
+            batch = [dict(zip(FIELDNAMES, values)) for values in cursor.fetchmany(batch_size)]
+            if not batch:
+                return count
+            sink.write_rows(batch)
+            count += len(batch)
+
+    def clear(self):
+        """Forget all progress, e.g. once a run has written its CSVs."""
+        with self.conn:
+            self.conn.execute("DELETE FROM rows")
+            self.conn.execute("DELETE FROM categories")
+
+    def close(self):
+        self.conn.close()
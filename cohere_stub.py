@@ -0,0 +1,85 @@
+"""Local stand-in for the Cohere chat API, for trying ReCarmend's AI search offline.
+
+Answers POST /v2/chat in the API's response format, filling in the filter
+lines with the local parser (leftover words ignored) after an optional delay
+that imitates model latency:
+
+    python cohere_stub.py --port 8765 --delay 0.5
+    CO_API_URL=http://127.0.0.1:8765 CO_API_KEY=stub python recarmend.py
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from ai_search import RESPONSE_FIELDS, LocalQueryParser
+
+# Filters the model reports as 0 rather than null when missing
+NUMERIC_FILTERS = {"max_price", "max_mileage", "min_year", "max_year"}
+
+
+def stub_answer(prompt, parser=None):
+    filters = (parser or LocalQueryParser()).parse(prompt, strict=False)
+    if filters is None:
+        return "this prompt does not relate to cars"
+    lines = []
+    for label, name in RESPONSE_FIELDS.items():
+        value = filters[name]
+        lines.append(f"{label}: {value if value is not None else (0 if name in NUMERIC_FILTERS else 'null')}")
+    return "\n".join(lines)
+
+
+class CohereStubHandler(BaseHTTPRequestHandler):
+    parser = LocalQueryParser()
+    delay = 0.0
+    requests = 0
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/v2/chat":
+            self.send_error(404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        prompt = next((m["content"] for m in reversed(body.get("messages", [])) if m.get("role") == "user"), "")
+        type(self).requests += 1
+        time.sleep(self.delay)
+        answer = {
+            "id": f"stub-{self.requests}",
+            "finish_reason": "COMPLETE",
+            "message": {"role": "assistant", "content": [{"type": "text", "text": stub_answer(prompt, self.parser)}]},
+            "usage": {"billed_units": {"input_tokens": len(prompt.split()), "output_tokens": 24}},
+        }
+        data = json.dumps(answer).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub(port=0, delay=0.0, vocabulary=None):
+    """Run the stand-in in a background thread; returns (server, base_url)."""
+    handler = type("Handler", (CohereStubHandler,), {"parser": LocalQueryParser(vocabulary), "delay": delay})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local stand-in for the Cohere chat API")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds to wait before every answer")
+    args = parser.parse_args(argv)
+    server, base_url = start_stub(args.port, args.delay)
+    print(f"Cohere stand-in listening on {base_url} (set CO_API_URL={base_url})")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,753 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+
+# undetected_chromedriver still imports distutils, which only setuptools provides on Python 3.12+
+import setuptools
+
+from selenium.common import TimeoutException, NoSuchElementException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.wait import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.chrome.options import Options
+
+import undetected_chromedriver as uc
+
+from checkpoint import CrawlCheckpoint
+from csv_output import OUTPUT_FORMATS, default_data_dir, output_sink
+from dedup import INDEX_FILENAME, DedupSink, ListingIndex
+from driver_lifecycle import DriverManager
+from history import HistoryTracker
+from incremental import IncrementalTracker
+from listing_table import ListingTable
+from telemetry import EVENTS_FILENAME, SUMMARY_FILENAME, metrics
+from resource_blocking import RESOURCE_PATTERNS, block_resources, resource_kinds
+from http_engine import create_http_client, scrape_sites_http
+from pacing import finish_page_turn, page_snapshot, rate_limiter, turn_page, wait_for_dom_quiet
+from sites import DEFAULT_SITE, SITES, schedule_categories, site_names
+
+def create_driver(multi_procs=False):
+    """Create and configure a new Chrome driver instance.
+
+    Pool workers pass multi_procs=True so concurrent processes share the already
+    patched chromedriver binary instead of patching it at the same time.
+    """
+    blocked = create_driver.blocked_resources
+    with metrics.timer("create_driver"):
+        driver = uc.Chrome(options=no_location_options(block_images="image" in blocked), version_main=142,
+                           user_multi_procs=multi_procs, headless=create_driver.headless)
+    driver.set_page_load_timeout(15)
+    driver.implicitly_wait(5)
+    # Skip downloading photos, fonts, ads and trackers the scraper never looks at
+    block_resources(driver, blocked)
+    return driver
+
+# Set from the command line by main (and passed on to pool workers)
+create_driver.blocked_resources = set()
+create_driver.headless = False
+
+def configure_drivers(blocked_resources, headless):
+    create_driver.blocked_resources = set(blocked_resources)
+    create_driver.headless = headless
+
+class BrowserFallback:
+    """Chrome started on demand by the HTTP engine when a page trips the captcha check."""
+
+    def __init__(self):
+        self.driver = None
+        self.consented = set()  # Sites whose cookie banner this browser has dismissed
+
+    def __call__(self, site, url):
+        if self.driver is None:
+            self.driver = create_driver()
+        rate_limiter.wait(url)
+        self.driver.get(url)
+        try:
+            WebDriverWait(self.driver, 10).until(EC.presence_of_element_located((By.TAG_NAME, "body")))
+        except TimeoutException:
+            pass
+        bypass_captcha(self.driver, site)
+        if site.name not in self.consented:
+            cookie_handler(self.driver, site)
+            self.consented.add(site.name)
+        # Wait for the real page content to settle before handing the HTML back
+        try:
+            WebDriverWait(self.driver, 5).until(EC.presence_of_element_located((By.CSS_SELECTOR, site.header_css)))
+        except TimeoutException:
+            pass
+        wait_for_dom_quiet(self.driver, site.listing_container_css)
+        return self.driver.page_source, self.driver.get_cookies()
+
+    def quit(self):
+        if self.driver:
+            self.driver.quit()
+            self.driver = None
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="main.py crawl",
+                                     description="Scrape car listings from carpages.ca and the other sites.SITES")
+    parser.add_argument("--sites", type=site_names, default=[DEFAULT_SITE], metavar="NAMES",
+                        help=f"comma-separated sites to crawl in one run ({', '.join(SITES)}; "
+                             f"default {DEFAULT_SITE})")
+    parser.add_argument("--engine", choices=["http", "browser"], default="browser",
+                        help="fetch pages over plain HTTP/2 (browser only for captchas) "
+                             "or drive Chrome for every page")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of browser worker processes crawling categories in parallel")
+    parser.add_argument("--fresh", action="store_true",
+                        help="ignore the checkpoint of an unfinished earlier run and start over")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default="csv",
+                        help="write CSVs, a typed Parquet dataset partitioned by body_type, or both")
+    parser.add_argument("--incremental", action="store_true",
+                        help="stop paging a category once it only shows listings from the last run and "
+                             "report new, changed and disappeared listings")
+    parser.add_argument("--known-pages", type=int, default=2,
+                        help="consecutive pages of already-known listings before an incremental crawl "
+                             "moves on to the next category")
+    parser.add_argument("--rate", type=float, default=2.0,
+                        help="maximum requests per second to each host (0 = unlimited)")
+    parser.add_argument("--no-spare", action="store_true",
+                        help="don't keep a pre-warmed spare browser for restarts (saves memory)")
+    parser.add_argument("--block-resources", action="store_true",
+                        help="block images, fonts, media, ads and trackers in the browser")
+    parser.add_argument("--allow-resources", type=resource_kinds, default=set(), metavar="KINDS",
+                        help="comma-separated kinds to still load while blocking the rest "
+                             f"({', '.join(RESOURCE_PATTERNS)}); implies --block-resources")
+    parser.add_argument("--prefetch", type=int, default=0, metavar="DEPTH",
+                        help="fetch up to DEPTH results pages ahead with --engine http; in the browser, "
+                             "any DEPTH > 0 requests the next page before parsing the current one")
+    parser.add_argument("--headless", action="store_true",
+                        help="run Chrome without a window (captchas can't be solved by hand)")
+    parser.add_argument("--no-history", action="store_true",
+                        help="don't record new listings and price/mileage changes in listing_history.sqlite3")
+    args = parser.parse_args(argv)
+    # Naming the kinds to keep only means something when the rest is blocked
+    args.block_resources = args.block_resources or bool(args.allow_resources)
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    rate_limiter.configure(args.rate)
+    blocked = set(RESOURCE_PATTERNS) - args.allow_resources if args.block_resources else set()
+    configure_drivers(blocked, args.headless)
+    navigate_category.pipeline = args.prefetch > 0
+    sites = [SITES[name] for name in args.sites]
+
+    # Data folder at the same hierarchy level as the project
+    data_dir = default_data_dir()
+    if not os.path.exists(data_dir):
+        os.makedirs(data_dir)
+    metrics.open(os.path.join(data_dir, EVENTS_FILENAME))
+
+    # Pick up rows and progress from a run that stopped before writing its CSVs
+    checkpoint = CrawlCheckpoint(data_dir)
+    if args.fresh:
+        checkpoint.clear()
+
+    # Rows are streamed to the output files page by page instead of being kept in memory
+    sink = output_sink(data_dir, args.format)
+    history = None
+    if not args.no_history:
+        # First/last seen and every price and mileage change, kept across runs
+        history = sink = HistoryTracker(sink, data_dir, checkpoint)
+    # Drop repeats of a listing (other body_types, re-scraped pages) before they are written
+    sink = DedupSink(sink, ListingIndex(os.path.join(data_dir, INDEX_FILENAME)))
+    incremental = None
+    if args.incremental:
+        incremental = sink = IncrementalTracker(sink, data_dir, args.known_pages, output_format=args.format)
+        print(f"Incremental crawl against {len(incremental.known)} known listings.")
+        if history:
+            history.incremental = incremental
+
+    restored = incremental.load_checkpoint(checkpoint) if incremental else checkpoint.load_rows(sink)
+    if restored:
+        print(f"Resuming earlier run: restored {restored} listings from {checkpoint.path}")
+
+    try:
+        if args.engine == "http":
+            client = create_http_client()
+            fallback = BrowserFallback()
+            try:
+                scrape_sites_http(client, sites, sink, fallback, checkpoint, incremental, args.prefetch)
+            finally:
+                client.close()
+                fallback.quit()
+        else:
+            # Create initial driver; the serial crawl keeps a warm spare ready for real restarts
+            browser = DriverManager(create_driver, prepare=partial(warm_up_driver, sites=sites),
+                                    spare_factory=partial(create_driver, multi_procs=True),
+                                    keep_spare=args.workers == 1 and not args.no_spare)
+            browser.start()
+            try:
+                if args.workers > 1:
+                    scrape_sites_parallel(browser.driver, sites, sink, data_dir, args.workers, checkpoint,
+                                          incremental)
+                else:
+                    scrape_sites(browser, sites, sink, checkpoint, incremental)
+            finally:
+                browser.quit()
+                print(browser.summary())
+        if incremental:
+            # Complete the snapshot with the known listings that weren't re-scraped
+            incremental.finish()
+    except BaseException:
+        # Keep the previous CSVs; the checkpoint has everything needed to resume
+        sink.abort()
+        checkpoint.close()
+        metrics.close()
+        raise
+
+    with metrics.timer("close_outputs"):
+        sink.close()
+    metrics.report(os.path.join(data_dir, SUMMARY_FILENAME))
+    if sink.total_rows:
+        print(f"Saved {sink.total_rows} listings in {len(sink.category_counts)} categories ({args.format}).")
+        # Everything is on disk now, so the next run starts from scratch
+        checkpoint.clear()
+    else:
+        print("No listings scraped; CSVs not written.")
+    checkpoint.close()
+
+def warm_up_driver(driver, sites):
+    """Load each site's homepage and accept its cookie banner so a new browser is ready to crawl."""
+    for site in sites:
+        rate_limiter.wait(site.homepage_url)
+        driver.get(site.homepage_url)
+        try:
+            WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.TAG_NAME, "body")))
+        except TimeoutException:
+            pass
+        cookie_handler(driver, site)
+
+def discover_category_urls(driver, site):
+    # Open webpage and wait to load
+    rate_limiter.wait(site.homepage_url)
+    driver.get(site.homepage_url)
+    WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.TAG_NAME, "body")))
+
+    # Handle cookie requests before scraping
+    cookie_handler(driver, site)
+
+    # Get URL links for each category
+    categories = driver.find_elements(By.CSS_SELECTOR, site.category_links_css)
+    raw_urls = [c.get_attribute("href") for c in categories if c.get_attribute("href")]
+
+    # Remove duplicates
+    return list(dict.fromkeys(raw_urls))
+
+def category_jobs(driver, sites, checkpoint=None):
+    """Every site's categories as scheduled (site, category_url) jobs."""
+    site_categories = [(site, discover_category_urls(driver, site)) for site in sites]
+    # Categories a previous, interrupted run already finished are left out
+    return schedule_categories(site_categories, checkpoint.finished_categories() if checkpoint else ())
+
+def scrape_sites(browser, sites, sink, checkpoint=None, incremental=None):
+    jobs = category_jobs(browser.driver, sites, checkpoint)
+
+    # Categories stuck on a captcha are parked so the others keep going, then retried
+    # at the end where it's fine to wait for a manual solve
+    parked = scrape_categories(browser, jobs, sink, checkpoint, incremental, park_when_stuck=True)
+    if parked:
+        print(f"\n >> Retrying {len(parked)} parked categories...")
+        scrape_categories(browser, parked, sink, checkpoint, incremental,
+                          park_when_stuck=False, restart_first=True)
+
+def scrape_categories(browser, jobs, sink, checkpoint=None, incremental=None,
+                      park_when_stuck=False, restart_first=False):
+    """Scrape the given (site, category_url) jobs one after another; returns the parked jobs."""
+    parked = []
+    bypass_captcha.park_when_stuck = park_when_stuck
+
+    # Access each category webpage with intercategory restart
+    for idx, (site, category_url) in enumerate(jobs):
+        metrics.category = category_url
+        # Reset browser between categories (except first one); cookies and consent are kept
+        if idx > 0 or restart_first:
+            print(f"\n >> Resetting browser between categories (cache reset)...")
+            browser.reset()
+            print(" >> Browser reset and ready.")
+        driver = browser.driver
+        
+        try:
+            navigate_page.count = 0
+            # Explicitly print before the blocking call
+            print(f"\n >> Requesting category {idx + 1}/{len(jobs)}: {category_url}...", end=" ", flush=True)
+            rate_limiter.wait(category_url)
+            try:
+                with metrics.timer("page_load"):
+                    driver.get(category_url)
+                    # Reduced timeout - body should load quickly
+                    try:
+                        WebDriverWait(driver, 5).until(EC.presence_of_element_located((By.TAG_NAME, "body")))
+                    except TimeoutException:
+                        pass  # Continue anyway, page might still be loading
+                print("Done.", flush=True)
+            except TimeoutException:
+                # Keep browser open to keep looping and scrape whatever loaded
+                print("Page load timed out! Forcing stop to continue scraping.")
+                driver.execute_script("window.stop();")
+
+            bypass_captcha(driver, site)
+            navigate_category(browser, site, sink, category_url, checkpoint, incremental)
+
+        except CaptchaParked as e:
+            print(f" >> Parking {category_url} (stuck on {e}); moving on to the next category.")
+            parked.append((site, category_url))
+
+        except Exception as e:
+            print(f"Skip {category_url} because of error: {e}")
+            continue  # Go to the next category
+
+    bypass_captcha.park_when_stuck = False
+    return parked
+
+def scrape_sites_parallel(driver, sites, sink, data_dir, workers, checkpoint=None, incremental=None):
+    """Crawl categories with a pool of worker processes, each driving its own Chrome."""
+    jobs = category_jobs(driver, sites, checkpoint)
+    # The discovery browser is not needed while the workers run
+    driver.quit()
+
+    print(f"\n >> Crawling {len(jobs)} categories with {workers} browser workers...")
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        known_pages = incremental.stop_after_known_pages if incremental else None
+        output_format = incremental.output_format if incremental else "csv"
+        driver_settings = (create_driver.blocked_resources, create_driver.headless)
+        # Workers get the site's name; they look the adapter up in SITES themselves
+        futures = {pool.submit(scrape_category_worker, site.name, url, data_dir, checkpoint is not None,
+                               known_pages, rate_limiter.rate, driver_settings, metrics.path,
+                               navigate_category.pipeline, output_format): url
+                   for site, url in jobs}
+        # Rows are written here in the parent only, so workers never share the output files
+        for future in as_completed(futures):
+            category_url = futures[future]
+            try:
+                worker_rows, complete_categories, worker_metrics = future.result()
+            except Exception as e:
+                print(f"Skip {category_url} because of error: {e}")
+                continue
+            metrics.merge(worker_metrics)
+            with metrics.timer("write"):
+                for batch in worker_rows.batches():
+                    sink.write_rows(batch)
+            if incremental:
+                for body_type in complete_categories:
+                    incremental.category_complete(body_type)
+            print(f" >> Finished {category_url} ({len(worker_rows)} listings)")
+
+    return None  # Workers quit their own browsers
+
+def scrape_category_worker(site_name, category_url, data_dir, use_checkpoint=False, known_pages=None, rate=None,
+                           driver_settings=None, telemetry_path=None, pipeline=False, output_format="csv"):
+    """Scrape one category of site_name in a pool worker with its own browser.
+
+    Returns the scraped rows (a ListingTable, compact to send back), the body_types that were crawled to their last page
+    and the worker's telemetry numbers for the parent's run report.
+    """
+    if rate is not None:
+        # Each worker process paces its own browser
+        rate_limiter.configure(rate)
+    if driver_settings is not None:
+        configure_drivers(*driver_settings)
+    navigate_category.pipeline = pipeline
+    site = SITES[site_name]
+    # Worker processes are reused across categories; hand back only this category's numbers
+    metrics.reset()
+    if telemetry_path:
+        metrics.open(telemetry_path, append=True)
+    metrics.category = category_url
+    collector = ListingTable()
+    # The parent does the change reporting; the worker only needs the stop rule
+    incremental = None
+    if known_pages is not None:
+        incremental = IncrementalTracker(collector, data_dir, known_pages, write_reports=False,
+                                         output_format=output_format)
+    # SQLite connections can't be shared across processes, so each worker opens its own
+    checkpoint = CrawlCheckpoint(data_dir) if use_checkpoint else None
+    # No spare browser per worker; restarts there are rare and each spare is a whole Chrome
+    browser = DriverManager(partial(create_driver, multi_procs=True), prepare=partial(warm_up_driver, sites=[site]),
+                            keep_spare=False)
+    driver = browser.start()
+    try:
+        # Each worker needs its own cookie consent
+        warm_up_driver(driver, [site])
+
+        navigate_page.count = 0
+        print(f"\n >> Requesting category: {category_url}", flush=True)
+        rate_limiter.wait(category_url)
+        try:
+            with metrics.timer("page_load"):
+                driver.get(category_url)
+                WebDriverWait(driver, 5).until(EC.presence_of_element_located((By.TAG_NAME, "body")))
+        except TimeoutException:
+            driver.execute_script("window.stop();")
+
+        bypass_captcha(driver, site)
+        navigate_category(browser, site, incremental or collector, category_url, checkpoint, incremental)
+    finally:
+        browser.quit()
+        if checkpoint:
+            checkpoint.close()
+        metrics.close()
+    complete_categories = sorted(incremental.complete_categories) if incremental else []
+    return collector, complete_categories, metrics.snapshot()
+
+def navigate_category(browser, site, sink, category_url, checkpoint=None, incremental=None):
+    try:
+        return crawl_category_pages(browser, site, sink, category_url, checkpoint, incremental)
+    finally:
+        # Whatever happened, a page that was already snapshotted still gets written
+        flush_pending_page(sink, checkpoint)
+
+# Pipelined pagination: click "→" first and parse the page just left while the next one loads
+navigate_category.pipeline = False
+
+PAGE_TURN_TIMEOUT = 7  # seconds for the next page to replace the current one
+
+def crawl_category_pages(browser, site, sink, category_url, checkpoint=None, incremental=None):
+    driver = browser.driver
+    defer = navigate_category.pipeline
+    print(f"Navigating in {driver.title}")
+    # Reset page counter for each new category
+    navigate_page.count = 0
+    
+    # Intracategory reset settings (reset browser state every N pages)
+    INTRACATEGORY_RESTART_INTERVAL = 50  # Reset browser every 50 pages
+    
+    # Wait for page to be fully loaded after any redirects/captcha
+    bypass_captcha(driver, site)
+    
+    # Wait for the actual page content to be ready (shorter timeout, continue if fails)
+    try:
+        WebDriverWait(driver, 5).until(
+            EC.presence_of_element_located((By.CSS_SELECTOR, site.header_css))
+        )
+    except TimeoutException:
+        print(" >> Warning: Page header not found, trying to continue...")
+    
+    # Get body_type once at the start
+    try:
+        header_text = driver.find_element(By.CSS_SELECTOR, site.header_css).text
+        body_type = site.category_name(header_text)
+    except Exception as e:
+        print(f" >> Error extracting body_type: {e}")
+        return driver  # Can't proceed without body_type
+    
+    # Jump to the last page an interrupted run finished, if there is one
+    progress = checkpoint.category_progress(category_url) if checkpoint else None
+    last_container = resume_category(driver, site, progress) if progress else None
+
+    # Scrape the first page - wait for it to be ready
+    if last_container is None:
+        last_container = navigate_page(driver, site, body_type, sink, checkpoint, category_url, defer)
+    if last_container is None:
+        print(" >> Failed to load first page, skipping category.")
+        return driver
+    
+    last_url = driver.current_url
+
+    while True:
+        try:
+            # Incremental crawl: the rest of the category was already scraped last run
+            if incremental and incremental.should_stop(body_type):
+                flush_pending_page(sink, checkpoint)
+                print(f" >> {incremental.stop_after_known_pages} pages of known listings in a row, "
+                      f"moving to the next category.")
+                if checkpoint:
+                    checkpoint.finish_category(category_url)
+                return driver
+
+            # Intracategory reset: clear browser cache every N pages, in place when possible
+            if navigate_page.count > 0 and navigate_page.count % INTRACATEGORY_RESTART_INTERVAL == 0:
+                current_page_url = driver.current_url
+                print(f"\n >> Intracategory reset at page {navigate_page.count} (cache reset)...")
+                flush_pending_page(sink, checkpoint)
+                driver = browser.reset()
+                
+                # Restore to the same page URL
+                rate_limiter.wait(current_page_url)
+                with metrics.timer("page_load"):
+                    driver.get(current_page_url)
+                    try:
+                        WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.TAG_NAME, "body")))
+                    except TimeoutException:
+                        pass
+                bypass_captcha(driver, site)
+                print(" >> Browser reset, continuing from same page.")
+            
+            # Quick captcha check (non-blocking if page is already loaded)
+            try:
+                bypass_captcha(driver, site)
+            except CaptchaParked:
+                raise
+            except Exception:
+                pass  # Continue if captcha check fails
+            
+            # Click "→" and let an in-page observer hand back the next page as soon as it replaces this one
+            rate_limiter.wait(last_url)
+            turn_started = time.monotonic()
+            turn = turn_page(driver, site.listing_container_css, site.page_indicator_css, site.next_link_text,
+                             PAGE_TURN_TIMEOUT, wait=not defer)
+            if turn is None:
+                print("No link found. Must be last page of category.")
+                flush_pending_page(sink, checkpoint)
+                if incremental:
+                    incremental.category_complete(body_type)
+                if checkpoint:
+                    checkpoint.finish_category(category_url)
+                return driver
+
+            if defer:
+                # The next page loads in the browser while the previous one is parsed and written
+                flush_pending_page(sink, checkpoint)
+                turn["page"] = finish_page_turn(driver, site.listing_container_css, site.page_indicator_css,
+                                                PAGE_TURN_TIMEOUT)
+            page = turn["page"]
+            if page is not None:
+                metrics.observe("page_turn", time.monotonic() - turn_started)
+            else:
+                # Nothing replaced the listings in time - scrape what is on screen if it is a new page
+                metrics.count("page_turn_timeouts")
+                page = page_snapshot(driver, site.listing_container_css, site.page_indicator_css)
+
+            if page is None:
+                print(" >> Page not ready yet, will retry...")
+                metrics.count("pagination_retries")
+                # Retry as soon as the listing area stops changing
+                wait_for_dom_quiet(driver, site.listing_container_css, timeout=2)
+            elif page.get("replaced") or page["url"] != (turn["url"] or last_url) or page["text"] != turn["text"]:
+                print(" >> Page loaded successfully.")
+                if navigate_page(driver, site, body_type, sink, checkpoint, category_url, defer, snapshot=page):
+                    last_url = page["url"]
+            else:
+                print(" >> Page appears unchanged, continuing...")
+
+        except CaptchaParked:
+            raise
+        except Exception as e:
+            print(f"Skip page because of error: {e}")
+            return driver
+
+def resume_category(driver, site, progress):
+    """Bring the browser to the last page a previous run saved, without scraping it again."""
+    pages, last_page_url, last_page_text = progress
+    print(f" >> Resuming category after page {pages}...")
+    if last_page_url and last_page_url != driver.current_url:
+        rate_limiter.wait(last_page_url)
+        driver.get(last_page_url)
+        bypass_captcha(driver, site)
+    elif last_page_text:
+        # AJAX pagination keeps the URL, so click through until the saved page is showing
+        for _ in range(pages):
+            current_text = page_indicator_text(driver, site)
+            next_link = driver.find_elements(By.LINK_TEXT, site.next_link_text)
+            if current_text == last_page_text or not next_link:
+                break
+            rate_limiter.wait(driver.current_url)
+            next_link[0].click()
+            try:
+                WebDriverWait(driver, 4).until(lambda d: page_indicator_text(d, site) != current_text)
+            except TimeoutException:
+                break
+        if page_indicator_text(driver, site) != last_page_text:
+            print(" >> Could not find the saved page, starting category over.")
+            return None
+
+    try:
+        container = WebDriverWait(driver, 8).until(
+            EC.presence_of_element_located((By.CSS_SELECTOR, site.listing_container_css))
+        )
+    except TimeoutException:
+        return None
+    navigate_page.count = pages
+    return container
+
+def page_indicator_text(driver, site):
+    """Text of the current page indicator (e.g. "1-50"), or None if the page has none."""
+    indicators = driver.find_elements(By.CSS_SELECTOR, site.page_indicator_css)
+    return indicators[0].text if indicators else None
+
+def navigate_page(driver, site, body_type, sink, checkpoint=None, category_url=None, defer=False, snapshot=None):
+    """Snapshot the results page on screen and write its rows.
+
+    With defer=True the snapshot is left in navigate_page.pending for
+    flush_pending_page, so it can be parsed while the next page loads.
+    A snapshot turn_page already brought back is used as is, without
+    asking the browser for anything.
+    """
+    if not hasattr(navigate_page, "count"):
+        navigate_page.count = 0
+    
+    # Quick captcha check (non-blocking if already past)
+    if snapshot is None:
+        try:
+            bypass_captcha(driver, site)
+        except CaptchaParked:
+            raise
+        except Exception:
+            pass  # Continue even if captcha check has issues
+    
+    try:
+        if snapshot is None:
+            # Reduced timeout - page should load faster after URL change
+            with metrics.timer("container_wait"):
+                page_car_listing_container = WebDriverWait(driver, 8).until(
+                    EC.presence_of_element_located((By.CSS_SELECTOR, site.listing_container_css))
+                )
+        else:
+            page_car_listing_container = snapshot
+        # Only increment page count once a real listing container is present.
+        navigate_page.count += 1
+        metrics.count("pages")
+        if snapshot is None:
+            print(f"Navigating page {navigate_page.count} in {driver.title}")
+            # Snapshot the whole container once and parse the listings offline
+            with metrics.timer("snapshot"):
+                container_html = page_car_listing_container.get_attribute("outerHTML")
+                page_url = driver.current_url
+                page_text = page_indicator_text(driver, site) if checkpoint else None
+        else:
+            print(f"Navigating page {navigate_page.count} ({snapshot['url']})")
+            container_html, page_url, page_text = snapshot["html"], snapshot["url"], snapshot["text"]
+        page = (site, container_html, page_url, page_text, navigate_page.count, body_type, category_url)
+        if defer:
+            navigate_page.pending = page
+        else:
+            write_page_snapshot(page, sink, checkpoint)
+        return page_car_listing_container
+    except (NoSuchElementException, TimeoutException):
+        # Don't print error - page might still be loading, will retry
+        return None
+    except Exception as e:
+        # Only print actual errors, not timeouts
+        print(f"(Error navigating page: {e})")
+        return None
+
+def write_page_snapshot(page, sink, checkpoint=None):
+    """Parse a page snapshot taken by navigate_page and write its rows."""
+    site, container_html, page_url, page_text, page_number, body_type, category_url = page
+    with metrics.timer("extract"):
+        page_rows = site.page_rows(container_html, page_url, body_type)
+    if not page_rows:
+        print("No car listing found.")
+        return
+    print(f"Found {len(page_rows)} car listings on this page.")
+    metrics.count("listings", len(page_rows))
+    # Journal the page before writing it so a crash in between can't lose it
+    if checkpoint:
+        with metrics.timer("checkpoint"):
+            checkpoint.record_page(category_url, body_type, page_number, page_url, page_text, page_rows)
+    with metrics.timer("write"):
+        sink.write_rows(page_rows)
+
+def flush_pending_page(sink, checkpoint=None):
+    """Write the page navigate_page(defer=True) left for later, if there is one."""
+    page = getattr(navigate_page, "pending", None)
+    navigate_page.pending = None
+    if page is not None:
+        write_page_snapshot(page, sink, checkpoint)
+
+def cookie_handler(driver, site):
+    if not site.cookie_button_xpath:
+        return
+    try:
+        print("Checking for cookie banner...")
+        # Wait for popup to press the button consent
+        # Press consent to go pass the cookie popup
+        cookie_btn = WebDriverWait(driver, 5).until(
+            EC.element_to_be_clickable((By.XPATH, site.cookie_button_xpath))
+        )
+
+        cookie_btn.click()
+        print("Cookie banner dismissed.")
+
+    except Exception as e:
+        print(f"Cookie banner skipped or not found. Details: {e}")
+        return
+
+    # Continue as soon as the popup is gone instead of sleeping
+    try:
+        WebDriverWait(driver, 3).until(EC.invisibility_of_element(cookie_btn))
+    except Exception:
+        pass
+
+def no_location_options(block_images=False):
+    chrome_options = Options()
+    # Define the preferences for browser to block location request and notifications
+    prefs = {
+        "profile.default_content_setting_values.geolocation": 2,
+        "profile.default_content_setting_values.notifications": 2
+    }
+    if block_images:
+        # Don't even decode images that slip past the blocked URL patterns
+        prefs["profile.managed_default_content_settings.images"] = 2
+
+    # Add preferences to options
+    chrome_options.add_experimental_option("prefs", prefs)
+    # Change so page does not wait for ads/pictures
+    chrome_options.page_load_strategy = 'none'
+
+    # Set chrome to not slow down in the background
+    chrome_options.add_argument("--disable-background-timer-throttling")
+    chrome_options.add_argument("--disable-backgrounding-occluded-windows")
+    chrome_options.add_argument("--disable-renderer-backgrounding")
+    
+    # Trick window to think it's full size even if hidden, to keep browser running smoothly
+    chrome_options.add_argument("--window-size=1920,1080")
+    # Return options
+    return chrome_options
+
+# How long to let a captcha/redirect page clear by itself before asking for help
+CAPTCHA_REDIRECT_WAIT = 10
+# How long a pool worker waits for a captcha to be solved by hand
+MANUAL_SOLVE_TIMEOUT = 300
+
+class CaptchaParked(Exception):
+    """Raised by bypass_captcha instead of waiting when the current category should be set aside."""
+
+def bypass_captcha(driver, site):
+    if not site.is_blocked(driver.title):
+        return
+    metrics.count("captcha_redirects")
+
+    # Most redirects clear on their own; check the title as soon as it changes
+    try:
+        with metrics.timer("captcha_wait"):
+            WebDriverWait(driver, CAPTCHA_REDIRECT_WAIT, poll_frequency=0.25).until(
+                lambda d: not site.is_blocked(d.title))
+        return
+    except TimeoutException:
+        current_title = driver.title
+    metrics.count("captcha_stalls")
+
+    # If waiting too long then there must be CAPTCHA to solve
+    if bypass_captcha.park_when_stuck:
+        raise CaptchaParked(current_title)
+
+    # Solve manually
+    print("\n" + "!" * 50)
+    print(f"!!! STUCK ON: {current_title} !!!")
+    print("Auto-redirect failed. Please solve manually in browser.")
+    print("!" * 50 + "\n")
+
+    if sys.stdin is not None and sys.stdin.isatty():
+        # After solving enter anything to exit this function and continue scraping
+        with metrics.timer("manual_captcha_wait"):
+            input("Press Enter to resume script...")
+        return
+
+    # Pool workers have no terminal; wait for the page to be solved in the browser window
+    try:
+        with metrics.timer("manual_captcha_wait"):
+            WebDriverWait(driver, MANUAL_SOLVE_TIMEOUT, poll_frequency=1).until(
+                lambda d: not site.is_blocked(d.title))
+    except TimeoutException:
+        print(f" >> Gave up waiting on {current_title}")
+
+# Set by scrape_categories while other categories are still waiting to be scraped
+bypass_captcha.park_when_stuck = False
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,141 @@
+"""CSV output for scraped listings."""
+import csv
+import os
+from collections import Counter
+
+FIELDNAMES = ["year", "make", "model", "price", "mileage", "color", "url", "body_type"]
+OUTPUT_FORMATS = ["csv", "parquet", "both"]
+
+
+def default_data_dir():
+    """The data folder next to the project folder, where crawls write their output."""
+    project_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(os.path.dirname(project_dir), "data")
+
+
+def write_rows_to_csv(rows, filepath="car_listings.csv"):
+    """Write row dicts, or a ListingTable straight from its columns."""
+    with open(filepath, "w", newline="", encoding="utf-8") as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=FIELDNAMES)
+        writer.writeheader()
+        if hasattr(rows, "csv_records"):
+            writer.writer.writerows(rows.csv_records())
+        else:
+            writer.writerows(rows)
+
+
+def category_csv_path(body_type, data_dir, prefix="car_listings"):
+    safe_name = body_type.lower().replace(" ", "_")
+    return os.path.join(data_dir, f"{prefix}_{safe_name}.csv")
+
+
+class CsvRowSink:
+    """Stream rows to all_listings.csv and one CSV per body_type while the crawl runs.
+
+    Rows are written a page at a time and the files are flushed at every page
+    boundary, so nothing accumulates in memory. Output goes to ".part" files
+    that replace the real CSVs only when close() is called after a complete
+    run; abort() leaves the previous CSVs untouched.
+    """
+
+    def __init__(self, data_dir, prefix="car_listings", aggregate_filename="all_listings.csv"):
+        self.data_dir = data_dir
+        self.prefix = prefix
+        self.aggregate_path = os.path.join(data_dir, aggregate_filename)
+        self.category_counts = Counter()
+        self.total_rows = 0
+        self._open = {}  # final path -> (file, DictWriter)
+
+    def _writer(self, filepath):
+        if filepath not in self._open:
+            csvfile = open(filepath + ".part", "w", newline="", encoding="utf-8")
+            writer = csv.DictWriter(csvfile, fieldnames=FIELDNAMES)
+            writer.writeheader()
+            self._open[filepath] = (csvfile, writer)
+        return self._open[filepath][1]
+
+    def _write(self, filepath, rows, records=False):
+        writer = self._writer(filepath)
+        if records:
+            writer.writer.writerows(rows)  # Lists in FIELDNAMES order, no dicts needed
+        else:
+            writer.writerows(rows)
+
+    def write_rows(self, rows):
+        """Append one page (or any batch) of rows and flush them to disk.
+
+        rows is a list of row dicts or a ListingTable, which is written straight
+        from its columns.
+        """
+        if not len(rows):
+            return
+        table = hasattr(rows, "csv_records")
+        self._write(self.aggregate_path, rows.csv_records() if table else rows, table)
+
+        if table:
+            by_category = rows.rows_by("body_type")
+        else:
+            by_category = {}
+            for row in rows:
+                by_category.setdefault(row["body_type"], []).append(row)
+        for body_type, category_rows in by_category.items():
+            path = category_csv_path(body_type, self.data_dir, self.prefix)
+            self._write(path, rows.csv_records(category_rows) if table else category_rows, table)
+            self.category_counts[body_type] += len(category_rows)
+        self.total_rows += len(rows)
+
+        for csvfile, _ in self._open.values():
+            csvfile.flush()
+
+    def close(self):
+        """Finish the run: move every written file into place."""
+        for filepath, (csvfile, _) in self._open.items():
+            csvfile.close()
+            os.replace(filepath + ".part", filepath)
+        self._open = {}
+
+    def abort(self):
+        """Stop without replacing the existing CSVs (e.g. after a crash)."""
+        for csvfile, _ in self._open.values():
+            csvfile.close()
+        self._open = {}
+
+
+class FanOutSink:
+    """Send every batch of rows to several sinks (e.g. CSV and Parquet) and count them once."""
+
+    def __init__(self, *sinks):
+        self.sinks = sinks
+        self.category_counts = Counter()
+        self.total_rows = 0
+
+    def write_rows(self, rows):
+        for sink in self.sinks:
+            sink.write_rows(rows)
+        if hasattr(rows, "rows_by"):
+            for body_type, category_rows in rows.rows_by("body_type").items():
+                self.category_counts[body_type] += len(category_rows)
+        else:
+            for row in rows:
+                self.category_counts[row["body_type"]] += 1
+        self.total_rows += len(rows)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+    def abort(self):
+        for sink in self.sinks:
+            sink.abort()
+
+
+def output_sink(data_dir, output_format="csv"):
+    """Sink writing CSVs, the Parquet dataset or both (output_format) into data_dir."""
+    sinks = []
+    if output_format in ("csv", "both"):
+        sinks.append(CsvRowSink(data_dir))
+    if output_format in ("parquet", "both"):
+        # pyarrow is only imported when Parquet is asked for
+        from parquet_output import ParquetRowSink
+        sinks.append(ParquetRowSink(data_dir))
+    return FanOutSink(*sinks)
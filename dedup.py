@@ -0,0 +1,146 @@
+"""Listing deduplication across categories, pages and runs.
+
+The same car is listed under several body_types (the "Cars" page is mapped
+to "hybrid") and AJAX pagination can re-scrape a page, so rows are checked
+against an index of listing keys (sites.listing_key: the site and the number
+at the end of the listing URL) before they reach the output files. Only the
+first row for each key is kept.
+The index also records every body_type the car was seen under, and it is
+saved to listing_index.npz so memberships build up across runs; `main.py
+stats` reports the cars listed under several body_types.
+
+Ids live in sorted NumPy arrays (8 bytes for the id, 8 for a bitmask of
+body_types, 1 for "seen this run"), so even hundreds of thousands of ids
+take only a few MB. New ids collect in a dict that is merged into the arrays
+in batches of at least 5000 (a quarter of the index once it is larger).
+"""
+import os
+
+import numpy as np
+
+from sites import listing_key
+from telemetry import metrics
+
+INDEX_FILENAME = "listing_index.npz"
+MAX_CATEGORIES = 64  # One bit per body_type in a uint64 mask
+
+
+class ListingIndex:
+    def __init__(self, path=None, merge_every=5000):
+        self.path = path
+        self.merge_every = merge_every
+        self.categories = []
+        self.ids = np.empty(0, dtype=np.int64)
+        self.masks = np.empty(0, dtype=np.uint64)
+        self.seen = np.empty(0, dtype=bool)
+        self._pending = {}  # id -> mask for ids first seen in this run
+        if path and os.path.exists(path):
+            with np.load(path) as saved:
+                self.ids = saved["ids"]
+                self.masks = saved["masks"]
+                self.categories = [str(name) for name in saved["categories"]]
+            self.seen = np.zeros(len(self.ids), dtype=bool)
+
+    def __len__(self):
+        return len(self.ids) + len(self._pending)
+
+    def _bit(self, body_type):
+        if body_type not in self.categories:
+            if len(self.categories) >= MAX_CATEGORIES:
+                raise ValueError(f"More than {MAX_CATEGORIES} body_types; widen the category mask")
+            self.categories.append(body_type)
+        return 1 << self.categories.index(body_type)
+
+    def add(self, car_id, body_type):
+        """Record car_id under body_type. Returns True the first time the id is seen in this run."""
+        bit = self._bit(body_type)
+        i = self.ids.searchsorted(car_id)
+        if i < len(self.ids) and self.ids[i] == car_id:
+            self.masks[i] |= np.uint64(bit)
+            if self.seen[i]:
+                return False
+            self.seen[i] = True
+            return True
+
+        mask = self._pending.get(car_id)
+        if mask is not None:
+            self._pending[car_id] = mask | bit
+            return False
+        self._pending[car_id] = bit
+        # Merge less often as the index grows, so merging stays linear overall
+        if len(self._pending) >= max(self.merge_every, len(self.ids) // 4):
+            self._merge()
+        return True
+
+    def _merge(self):
+        if not self._pending:
+            return
+        new_ids = np.fromiter(self._pending.keys(), dtype=np.int64, count=len(self._pending))
+        new_masks = np.fromiter(self._pending.values(), dtype=np.uint64, count=len(self._pending))
+        order = np.argsort(new_ids)
+        new_ids, new_masks = new_ids[order], new_masks[order]
+        # Both sides are sorted, so the new ids just slot in
+        positions = self.ids.searchsorted(new_ids)
+        self.ids = np.insert(self.ids, positions, new_ids)
+        self.masks = np.insert(self.masks, positions, new_masks)
+        self.seen = np.insert(self.seen, positions, True)
+        self._pending = {}
+
+    def category_overlaps(self):
+        """{(body_type, ...): cars} for every combination of two or more body_types cars were listed under."""
+        self._merge()
+        overlaps = {}
+        for mask, count in zip(*(values.tolist() for values in np.unique(self.masks, return_counts=True))):
+            names = tuple(name for bit, name in enumerate(self.categories) if mask >> bit & 1)
+            if len(names) > 1:
+                overlaps[names] = count
+        return overlaps
+
+    def save(self):
+        self._merge()
+        if not self.path:
+            return
+        part_path = self.path + ".part"
+        with open(part_path, "wb") as index_file:
+            np.savez(index_file, ids=self.ids, masks=self.masks, categories=np.array(self.categories, dtype=str))
+        os.replace(part_path, self.path)
+
+
+class DedupSink:
+    """Row sink wrapper that drops rows whose listing id was already written in this run."""
+
+    def __init__(self, sink, index):
+        self.sink = sink
+        self.index = index
+        self.duplicates = 0
+
+    @property
+    def total_rows(self):
+        return self.sink.total_rows
+
+    @property
+    def category_counts(self):
+        return self.sink.category_counts
+
+    def write_rows(self, rows):
+        unique = []
+        for row in rows:
+            car_id = listing_key(row["url"])
+            # Rows without a recognizable id can't be matched, so they are always kept
+            if car_id is None or self.index.add(car_id, row["body_type"]):
+                unique.append(row)
+        dropped = len(rows) - len(unique)
+        if dropped:
+            self.duplicates += dropped
+            metrics.count("duplicates", dropped)
+        self.sink.write_rows(unique)
+
+    def close(self):
+        self.sink.close()
+        self.index.save()
+        if self.duplicates:
+            print(f"Dropped {self.duplicates} duplicate listings ({len(self.index)} ids in the listing index).")
+
+    def abort(self):
+        # The checkpoint replays this run's rows on resume, so the index isn't saved
+        self.sink.abort()
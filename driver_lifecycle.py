@@ -0,0 +1,174 @@
+"""Browser lifecycle: reset Chrome in place instead of quitting and relaunching it.
+
+A relaunch pays for uc.Chrome startup and driver patching, a homepage load and
+the cookie banner all over again. A reset instead clears the HTTP cache and
+the site's cached storage over CDP and continues in a fresh tab, keeping the
+cookies (and with them the cookie consent). A driver is only replaced when it
+stops responding, and then by a spare that was launched and warmed up in the
+background beforehand and is handed the old driver's cookies.
+"""
+import threading
+import time
+from urllib.parse import urlparse
+
+from telemetry import metrics
+
+# Everything the site can pile up between resets except cookies and localStorage,
+# which hold the cookie consent. sessionStorage goes with the old tab.
+RESET_STORAGE_TYPES = "appcache,cache_storage,file_systems,indexeddb,service_workers,shader_cache,websql"
+
+# Fields of a CDP Cookie that Network.setCookies accepts back
+COOKIE_PARAM_KEYS = ("name", "value", "domain", "path", "secure", "httpOnly", "sameSite", "expires")
+
+
+def page_origin(url):
+    parts = urlparse(url or "")
+    return f"{parts.scheme}://{parts.netloc}" if parts.scheme in ("http", "https") else None
+
+
+def reset_driver_state(driver):
+    """Clear the browser cache and the current site's storage and continue in a fresh tab."""
+    origin = page_origin(driver.current_url)
+    driver.execute_cdp_cmd("Network.clearBrowserCache", {})
+    if origin:
+        driver.execute_cdp_cmd("Storage.clearDataForOrigin",
+                               {"origin": origin, "storageTypes": RESET_STORAGE_TYPES})
+
+    # A new tab gets a fresh renderer, dropping whatever the old page held on to
+    old_handle = driver.current_window_handle
+    driver.switch_to.new_window("tab")
+    new_handle = driver.current_window_handle
+    driver.switch_to.window(old_handle)
+    driver.close()
+    driver.switch_to.window(new_handle)
+
+    # Per-tab CDP settings (e.g. the resource block list) have to be applied again
+    for command, args in getattr(driver, "tab_cdp_commands", ()):
+        driver.execute_cdp_cmd(command, args)
+
+
+def all_cookies(driver):
+    """Every cookie in the browser (not just the current page's), as CDP cookie params."""
+    cookies = []
+    for cookie in driver.execute_cdp_cmd("Network.getAllCookies", {})["cookies"]:
+        param = {key: cookie[key] for key in COOKIE_PARAM_KEYS if key in cookie}
+        if cookie.get("session"):
+            param.pop("expires", None)
+        cookies.append(param)
+    return cookies
+
+
+def set_cookies(driver, cookies):
+    # Unlike driver.add_cookie this doesn't need a page of the cookie's domain to be open
+    if cookies:
+        driver.execute_cdp_cmd("Network.setCookies", {"cookies": cookies})
+
+
+class DriverManager:
+    """Owns the crawl's Chrome driver: in-place resets, a warm spare, and restart timings.
+
+    factory() launches a driver, prepare(driver) readies a new one (homepage and
+    cookie banner) and spare_factory launches the background spare, which has
+    to share the already patched chromedriver (create_driver(multi_procs=True)).
+    Callers keep using manager.driver, or the driver reset()/restart() return.
+    """
+
+    def __init__(self, factory, prepare=None, spare_factory=None, keep_spare=True):
+        self.factory = factory
+        self.prepare = prepare
+        self.spare_factory = spare_factory or factory
+        self.keep_spare = keep_spare
+        self.driver = None
+        self.cookies = []
+        self.timings = {"reset": [], "restart": []}
+        self._spare = None
+        self._spare_thread = None
+
+    def start(self):
+        self.driver = self.factory()
+        self._warm_spare()
+        return self.driver
+
+    def _launch_spare(self):
+        try:
+            spare = self.spare_factory()
+            if self.prepare:
+                self.prepare(spare)
+            self._spare = spare
+        except Exception as e:
+            print(f" >> Could not start a spare browser: {e}")
+
+    def _warm_spare(self):
+        if not self.keep_spare or self._spare_thread is not None:
+            return
+        self._spare_thread = threading.Thread(target=self._launch_spare, daemon=True)
+        self._spare_thread.start()
+
+    def _take_spare(self):
+        if self._spare_thread is not None:
+            self._spare_thread.join()
+            self._spare_thread = None
+        spare, self._spare = self._spare, None
+        if spare is None:
+            spare = self.factory()
+            if self.prepare:
+                self.prepare(spare)
+        return spare
+
+    def reset(self):
+        """Reset the current driver in place, or replace it if it no longer responds."""
+        started = time.monotonic()
+        try:
+            self.cookies = all_cookies(self.driver)
+            reset_driver_state(self.driver)
+        except Exception as e:
+            print(f" >> In-place reset failed ({e}), switching to a fresh browser...")
+            return self.restart()
+        self._record("reset", time.monotonic() - started)
+        return self.driver
+
+    def restart(self):
+        """Swap in the spare driver (or launch one), carrying the cookies across."""
+        started = time.monotonic()
+        try:
+            self.cookies = all_cookies(self.driver)
+        except Exception:
+            pass  # Old browser is gone; use the cookies saved at the last reset
+        old_driver = self.driver
+        self.driver = self._take_spare()
+        try:
+            set_cookies(self.driver, self.cookies)
+        except Exception as e:
+            print(f" >> Could not carry cookies to the new browser: {e}")
+        try:
+            old_driver.quit()
+        except Exception:
+            pass
+        self._warm_spare()
+        self._record("restart", time.monotonic() - started)
+        return self.driver
+
+    def _record(self, kind, seconds):
+        self.timings[kind].append(seconds)
+        metrics.observe(f"browser_{kind}", seconds)
+        metrics.count(f"browser_{kind}s")
+
+    def quit(self):
+        if self._spare_thread is not None:
+            self._spare_thread.join()
+            self._spare_thread = None
+        for driver in (self.driver, self._spare):
+            if driver:
+                try:
+                    driver.quit()
+                except Exception:
+                    pass
+        self.driver = self._spare = None
+
+    def summary(self):
+        parts = []
+        for kind, label in (("reset", "in-place resets"), ("restart", "restarts")):
+            times = self.timings[kind]
+            if times:
+                parts.append(f"{len(times)} {label} (avg {sum(times) / len(times):.2f}s, max {max(times):.2f}s)")
+        return "Browser: " + (", ".join(parts) if parts else "no resets")
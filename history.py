@@ -0,0 +1,350 @@
+"""Listing history across crawls: first/last seen and every price and mileage change.
+
+The CSV snapshots are rewritten on every run, so they only ever show the
+latest prices. listing_history.sqlite3 in the data folder keeps the rest,
+keyed by sites.listing_key (the site and the listing id at the end of the
+URL; the listing_id columns hold that key):
+
+    listings      current state of every listing ever seen (one row per id),
+                  with first_seen and, once it is gone, last_seen
+    changes_YYYYMM  append-only events, one table per month: "new", "changed"
+                  (price and/or mileage, with the differences), "gone" and
+                  "back" (relisted)
+    crawls        one row per body_type per run, so "still listed as of" is
+                  known without touching every listing
+
+A crawl only writes events. Each scraped page costs one indexed lookup of its
+ids; unchanged listings are not written at all, so a daily crawl writes in
+proportion to what changed. Queries over a time window (e.g. price drops in
+the last 7 days by body_type) only open the monthly tables that overlap it
+and range-scan their (kind, seen_at) index.
+
+    python main.py history --days 7                 # changes per body_type and the biggest price drops
+    python main.py history --url https://www.carpages.ca/used-cars/...-13299512/
+"""
+import os
+import sqlite3
+import time
+
+from sites import listing_key
+from listing_parser import parse_mileage, parse_price
+
+HISTORY_FILENAME = "listing_history.sqlite3"
+EVENT_KINDS = ("new", "changed", "gone", "back")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS listings (
+    listing_id INTEGER PRIMARY KEY,
+    url        TEXT,
+    body_type  TEXT,
+    year       TEXT,
+    make       TEXT,
+    model      TEXT,
+    color      TEXT,
+    price      INTEGER,
+    mileage    INTEGER,
+    first_seen REAL NOT NULL,
+    last_seen  REAL,
+    active     INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS listings_active ON listings (active, body_type);
+CREATE TABLE IF NOT EXISTS crawls (
+    started   REAL NOT NULL,
+    body_type TEXT NOT NULL,
+    complete  INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS crawls_body_type ON crawls (body_type, started);
+"""
+
+PARTITION_SCHEMA = """
+CREATE TABLE IF NOT EXISTS {name} (
+    listing_id     INTEGER NOT NULL,
+    seen_at        REAL NOT NULL,
+    kind           TEXT NOT NULL,
+    body_type      TEXT,
+    price          INTEGER,
+    mileage        INTEGER,
+    price_change   INTEGER,
+    mileage_change INTEGER
+);
+CREATE INDEX IF NOT EXISTS {name}_kind ON {name} (kind, seen_at);
+CREATE INDEX IF NOT EXISTS {name}_listing ON {name} (listing_id);
+"""
+
+EVENT_COLUMNS = ("listing_id", "seen_at", "kind", "body_type", "price", "mileage", "price_change",
+                 "mileage_change")
+LISTING_COLUMNS = ("listing_id", "url", "body_type", "year", "make", "model", "color", "price", "mileage",
+                   "first_seen", "last_seen", "active")
+
+
+def partition_name(timestamp):
+    return "changes_" + time.strftime("%Y%m", time.gmtime(timestamp))
+
+
+def difference(new, old):
+    return new - old if new is not None and old is not None else None
+
+
+class ListingHistory:
+    """The history database in data_dir/listing_history.sqlite3."""
+
+    def __init__(self, data_dir, filename=HISTORY_FILENAME):
+        self.path = os.path.join(data_dir, filename)
+        self.conn = sqlite3.connect(self.path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+        self.partitions = {name for (name,) in self.conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'changes_%'")}
+
+    def _partition(self, timestamp):
+        name = partition_name(timestamp)
+        if name not in self.partitions:
+            self.conn.executescript(PARTITION_SCHEMA.format(name=name))
+            self.partitions.add(name)
+        return name
+
+    def _partitions_since(self, since):
+        """Monthly tables that can hold events from since on (table names sort by month)."""
+        first = partition_name(since)
+        return sorted(name for name in self.partitions if name >= first)
+
+    def current(self, ids):
+        """listing_id -> (price, mileage, active) for the ids already in the history."""
+        found = {}
+        ids = list(ids)
+        # SQLite caps the number of ? parameters in one statement
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            cursor = self.conn.execute(f"SELECT listing_id, price, mileage, active FROM listings "
+                                       f"WHERE listing_id IN ({', '.join('?' for _ in chunk)})", chunk)
+            found.update((listing, (price, mileage, active)) for listing, price, mileage, active in cursor)
+        return found
+
+    def record(self, rows, seen_at=None):
+        """Compare scraped rows with the history and write the changes. Returns the listing ids seen."""
+        seen_at = time.time() if seen_at is None else seen_at
+        by_id = {}
+        for row in rows:
+            listing = listing_key(row["url"])
+            # A URL without an id can't be followed from one crawl to the next
+            if listing is not None:
+                by_id.setdefault(listing, row)
+        if not by_id:
+            return set()
+
+        known = self.current(by_id)
+        events, new_listings, updates = [], [], []
+        for listing, row in by_id.items():
+            price, mileage = parse_price(row["price"]), parse_mileage(row["mileage"])
+            before = known.get(listing)
+            if before is None:
+                events.append((listing, seen_at, "new", row["body_type"], price, mileage, None, None))
+                new_listings.append((listing, row["url"], row["body_type"], row["year"], row["make"], row["model"],
+                                     row["color"], price, mileage, seen_at))
+                continue
+            old_price, old_mileage, active = before
+            if not active:
+                events.append((listing, seen_at, "back", row["body_type"], price, mileage,
+                               difference(price, old_price), difference(mileage, old_mileage)))
+            elif (price, mileage) != (old_price, old_mileage):
+                events.append((listing, seen_at, "changed", row["body_type"], price, mileage,
+                               difference(price, old_price), difference(mileage, old_mileage)))
+            else:
+                continue
+            updates.append((price, mileage, listing))
+
+        if events:
+            # executescript commits, so the month's table is created before the transaction opens
+            partition = self._partition(seen_at)
+            with self.conn:
+                self.conn.executemany(
+                    f"INSERT INTO {partition} ({', '.join(EVENT_COLUMNS)}) "
+                    f"VALUES ({', '.join('?' for _ in EVENT_COLUMNS)})", events)
+                self.conn.executemany(
+                    "INSERT INTO listings (listing_id, url, body_type, year, make, model, color, price, mileage, "
+                    "first_seen) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", new_listings)
+                self.conn.executemany(
+                    "UPDATE listings SET price = ?, mileage = ?, active = 1, last_seen = NULL "
+                    "WHERE listing_id = ?", updates)
+        return set(by_id)
+
+    def finish_crawl(self, started, seen_ids, body_types, complete_body_types, finished_at=None):
+        """Record a finished run and mark listings of completely crawled body_types it didn't see as gone.
+
+        Returns how many listings went.
+        """
+        finished_at = time.time() if finished_at is None else finished_at
+        gone = []
+        for body_type in complete_body_types:
+            # The previous crawl of this body_type is the last time the missing listings were seen
+            last_crawl = self.conn.execute(
+                "SELECT MAX(started) FROM crawls WHERE body_type = ?", (body_type,)).fetchone()[0]
+            for listing, price, mileage in self.conn.execute(
+                    "SELECT listing_id, price, mileage FROM listings WHERE active = 1 AND body_type = ?",
+                    (body_type,)):
+                if listing not in seen_ids:
+                    gone.append((listing, body_type, price, mileage, last_crawl))
+        # Created up front: executescript would commit the crawls rows apart from the gone events
+        partition = self._partition(finished_at) if gone else None
+        with self.conn:
+            self.conn.executemany("INSERT INTO crawls (started, body_type, complete) VALUES (?, ?, ?)",
+                                  [(started, body_type, int(body_type in complete_body_types))
+                                   for body_type in sorted(set(body_types) | set(complete_body_types))])
+            if gone:
+                self.conn.executemany(
+                    f"INSERT INTO {partition} ({', '.join(EVENT_COLUMNS)}) "
+                    f"VALUES ({', '.join('?' for _ in EVENT_COLUMNS)})",
+                    [(listing, finished_at, "gone", body_type, price, mileage, None, None)
+                     for listing, body_type, price, mileage, _ in gone])
+                self.conn.executemany(
+                    "UPDATE listings SET active = 0, last_seen = ? WHERE listing_id = ?",
+                    [(last_crawl, listing) for listing, _, _, _, last_crawl in gone])
+        return len(gone)
+
+    def events(self, since, kinds=EVENT_KINDS, body_type=None, where="", params=()):
+        """Events from since on, oldest first, as dicts with the listing's url."""
+        selects, args = [], []
+        for name in self._partitions_since(since):
+            selects.append(
+                f"SELECT {', '.join('c.' + column for column in EVENT_COLUMNS)}, l.url FROM {name} c "
+                f"JOIN listings l ON l.listing_id = c.listing_id "
+                f"WHERE c.kind IN ({', '.join('?' for _ in kinds)}) AND c.seen_at >= ?"
+                + (" AND c.body_type = ?" if body_type else "") + where)
+            args += [*kinds, since] + ([body_type] if body_type else []) + list(params)
+        if not selects:
+            return []
+        cursor = self.conn.execute(" UNION ALL ".join(selects) + " ORDER BY seen_at", args)
+        return [dict(zip(EVENT_COLUMNS + ("url",), values)) for values in cursor]
+
+    def price_drops(self, days=7, body_type=None, now=None):
+        """Price drops in the last days, grouped by body_type: {body_type: [event, ...]}, biggest first."""
+        since = (time.time() if now is None else now) - days * 86400
+        drops = {}
+        for event in self.events(since, ("changed", "back"), body_type, " AND c.price_change < 0"):
+            drops.setdefault(event["body_type"], []).append(event)
+        for events in drops.values():
+            events.sort(key=lambda event: event["price_change"])
+        return drops
+
+    def summary(self, days=7, now=None):
+        """{body_type: {kind: count}} of the events in the last days."""
+        since = (time.time() if now is None else now) - days * 86400
+        counts = {}
+        for name in self._partitions_since(since):
+            for body_type, kind, count in self.conn.execute(
+                    f"SELECT body_type, kind, COUNT(*) FROM {name} "
+                    f"WHERE kind IN ({', '.join('?' for _ in EVENT_KINDS)}) AND seen_at >= ? "
+                    f"GROUP BY body_type, kind", (*EVENT_KINDS, since)):
+                kinds = counts.setdefault(body_type, dict.fromkeys(EVENT_KINDS, 0))
+                kinds[kind] += count
+        return counts
+
+    def listing(self, url):
+        """A listing's current state (last_seen is the latest crawl while it is listed) and its events."""
+        listing = listing_key(url)
+        row = self.conn.execute(f"SELECT {', '.join(LISTING_COLUMNS)} FROM listings WHERE listing_id = ?",
+                                (listing,)).fetchone()
+        if row is None:
+            return None
+        state = dict(zip(LISTING_COLUMNS, row))
+        if state["active"]:
+            state["last_seen"] = self.conn.execute(
+                "SELECT MAX(started) FROM crawls WHERE body_type = ?", (state["body_type"],)).fetchone()[0]
+        events = []
+        for name in sorted(self.partitions):
+            events += [dict(zip(EVENT_COLUMNS, values)) for values in self.conn.execute(
+                f"SELECT {', '.join(EVENT_COLUMNS)} FROM {name} WHERE listing_id = ?", (listing,))]
+        state["events"] = sorted(events, key=lambda event: event["seen_at"])
+        return state
+
+    def close(self):
+        self.conn.close()
+
+
+class HistoryTracker:
+    """Row sink wrapper that records every scraped page in the listing history.
+
+    Rows are passed straight on to the wrapped sink. When the run closes
+    normally, the listings of completely crawled body_types that didn't show
+    up are marked gone: the ones IncrementalTracker saw to their last page
+    with --incremental (set .incremental), otherwise the checkpoint's
+    finished categories.
+    """
+
+    def __init__(self, sink, data_dir, checkpoint=None, incremental=None):
+        self.sink = sink
+        self.history = ListingHistory(data_dir)
+        self.checkpoint = checkpoint
+        self.incremental = incremental
+        self.started = time.time()
+        self.seen = set()
+        self.body_types = set()
+
+    @property
+    def total_rows(self):
+        return self.sink.total_rows
+
+    @property
+    def category_counts(self):
+        return self.sink.category_counts
+
+    def write_rows(self, rows):
+        if rows:
+            self.seen |= self.history.record(rows)
+            self.body_types.update(row["body_type"] for row in rows)
+        self.sink.write_rows(rows)
+
+    def close(self):
+        self.sink.close()
+        if self.incremental:
+            complete = self.incremental.complete_categories
+        elif self.checkpoint:
+            complete = self.checkpoint.finished_body_types()
+        else:
+            complete = self.body_types
+        gone = self.history.finish_crawl(self.started, self.seen, self.body_types, complete)
+        print(f"Listing history: {len(self.seen)} listings seen, {gone} gone ({self.history.path}).")
+        self.history.close()
+
+    def abort(self):
+        # What was recorded stays; the resumed run's pages match it and add nothing
+        self.sink.abort()
+        self.history.close()
+
+
+def print_history(data_dir, days=7, body_type=None, url=None, top=5):
+    if not os.path.exists(os.path.join(data_dir, HISTORY_FILENAME)):
+        print(f"No {HISTORY_FILENAME} in {data_dir} (it is written by `main.py crawl`)")
+        return
+    history = ListingHistory(data_dir)
+    try:
+        if url:
+            listing = history.listing(url)
+            if listing is None:
+                print(f"No history for {url}")
+                return
+            seen = [time.strftime("%Y-%m-%d", time.localtime(t)) if t else "-"
+                    for t in (listing["first_seen"], listing["last_seen"])]
+            print(f"{listing['year']} {listing['make']} {listing['model']} ({listing['body_type']}), "
+                  f"first seen {seen[0]}, last seen {seen[1]}{'' if listing['active'] else ', gone'}")
+            for event in listing["events"]:
+                changes = ", ".join(f"{name} {event[name + '_change']:+,}" for name in ("price", "mileage")
+                                    if event[name + "_change"])
+                print(f"  {time.strftime('%Y-%m-%d %H:%M', time.localtime(event['seen_at']))}  "
+                      f"{event['kind']:<8} ${event['price'] or 0:,}  {event['mileage'] or 0:,} km  {changes}")
+            return
+
+        counts = history.summary(days)
+        drops = history.price_drops(days, body_type)
+        print(f"Listing changes in the last {days:g} days:")
+        for name in sorted(counts):
+            if body_type is None or name == body_type:
+                print(f"  {name:<14} " + "  ".join(f"{kind} {n:>5}" for kind, n in counts[name].items()))
+        for name, events in sorted(drops.items()):
+            print(f"Price drops, {name} ({len(events)}):")
+            for event in events[:top]:
+                print(f"  ${event['price'] - event['price_change']:,} -> ${event['price']:,} "
+                      f"({event['price_change']:+,})  {event['url']}")
+    finally:
+        history.close()
@@ -0,0 +1,228 @@
+"""Pure-HTTP crawl engine.
+
+Results pages are server-rendered, so most of them can be fetched with a pooled
+HTTP/2 client and parsed with the same row extraction the browser crawl uses.
+Chrome is only started when a response looks like a captcha/redirect page.
+Everything site-specific comes from a sites.SiteAdapter.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import lxml.html
+
+from pacing import rate_limiter
+from telemetry import metrics
+from listing_parser import element_text
+from sites import schedule_categories
+
+# Look like the browser the Selenium crawl drives
+DEFAULT_HEADERS = {
+    "User-Agent": ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                   "(KHTML, like Gecko) Chrome/142.0.0.0 Safari/537.36"),
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-CA,en;q=0.9",
+}
+# Error statuses that mean "prove you're a browser" rather than a missing or broken page
+BLOCKED_STATUSES = (403, 429)
+
+
+def create_http_client():
+    """Create one pooled HTTP/2 client that is reused for the whole crawl."""
+    return httpx.Client(
+        http2=True,
+        headers=DEFAULT_HEADERS,
+        follow_redirects=True,
+        timeout=15,
+        limits=httpx.Limits(max_connections=10, max_keepalive_connections=10),
+    )
+
+
+def page_title(root):
+    title = root.find(".//title")
+    return element_text(title) if title is not None else ""
+
+
+def fetch_page(client, site, url, browser_fallback=None):
+    """Fetch a page of site and return (html, final_url).
+
+    If the response is a captcha/redirect page (site.is_blocked, or a 403/429),
+    the page is loaded through browser_fallback(site, url) -> (page_source,
+    cookies) instead and the browser's cookies are copied into the client so
+    later requests pass too. Other error statuses return (None, url).
+    """
+    rate_limiter.wait(url)
+    with metrics.timer("fetch"):
+        response = client.get(url)
+    html = response.text
+    title = page_title(lxml.html.fromstring(html)) if html.strip() else ""
+    if response.status_code >= 400 and response.status_code not in BLOCKED_STATUSES:
+        print(f" >> HTTP {response.status_code} on {url}")
+        return None, url
+    if response.status_code < 400 and not site.is_blocked(title):
+        return html, str(response.url)
+
+    print(f" >> HTTP engine blocked on {url} ({response.status_code}, {title!r})")
+    if browser_fallback is None:
+        return None, url
+
+    print(" >> Falling back to the browser for this page...")
+    metrics.count("browser_fallbacks")
+    with metrics.timer("browser_fallback"):
+        page_source, cookies = browser_fallback(site, url)
+    for cookie in cookies:
+        client.cookies.set(cookie["name"], cookie["value"], domain=cookie.get("domain", ""))
+    return page_source, url
+
+
+class PagePrefetcher:
+    """Fetch upcoming results pages in background threads while the current one is parsed.
+
+    At most depth pages are fetched ahead. Background fetches never use the
+    browser fallback (the browser isn't thread-safe); a page that was blocked
+    in the background is fetched again by get(), where the fallback can run.
+    With depth=0 every page is simply fetched when it's needed.
+    """
+
+    def __init__(self, client, site, depth=0):
+        self.client = client
+        self.site = site
+        self.depth = depth
+        self.executor = ThreadPoolExecutor(max_workers=depth, thread_name_prefix="prefetch") if depth else None
+        self.pending = {}  # url -> Future of fetch_page
+
+    def schedule(self, next_url, root):
+        """Start fetching next_url and the pages after it; root is the current page's parsed HTML."""
+        if self.executor is None or not next_url:
+            return
+        wanted = self.site.lookahead_urls(next_url, self.depth, self.site.highest_listed_page(root))
+        # Drop guesses that turned out wrong so they don't hold a slot
+        for url in list(self.pending):
+            if url not in wanted:
+                self.pending.pop(url).cancel()
+        for url in wanted:
+            if url not in self.pending:
+                self.pending[url] = self.executor.submit(fetch_page, self.client, self.site, url)
+
+    def get(self, url, browser_fallback=None):
+        future = self.pending.pop(url, None)
+        if future is not None:
+            html, final_url = future.result()
+            if html is not None:
+                metrics.count("prefetch_hits")
+                return html, final_url
+        return fetch_page(self.client, self.site, url, browser_fallback)
+
+    def close(self):
+        if self.executor is not None:
+            for future in self.pending.values():
+                future.cancel()
+            self.pending = {}
+            # Don't hold up the next category for a guess that is still loading
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def scrape_sites_http(client, sites, sink, browser_fallback=None, checkpoint=None, incremental=None, prefetch=0):
+    site_categories = []
+    for site in sites:
+        html, final_url = fetch_page(client, site, site.homepage_url, browser_fallback)
+        if html is None:
+            print(f"Could not load the {site.name} homepage over HTTP.")
+            continue
+        site_categories.append((site, site.category_urls(html, final_url)))
+
+    # Categories a previous, interrupted run already finished are skipped
+    jobs = schedule_categories(site_categories, checkpoint.finished_categories() if checkpoint else ())
+    for idx, (site, category_url) in enumerate(jobs):
+        print(f"\n >> Requesting category {idx + 1}/{len(jobs)}: {category_url}")
+        metrics.category = category_url
+        try:
+            navigate_category_http(client, site, sink, category_url, browser_fallback, checkpoint, incremental,
+                                   prefetch)
+        except Exception as e:
+            # Also browser fallback failures (Chrome launch, driver download); the category stays unfinished
+            print(f"Skip {category_url} because of error: {e}")
+            continue
+
+
+def navigate_category_http(client, site, sink, category_url, browser_fallback=None, checkpoint=None,
+                           incremental=None, prefetch=0):
+    prefetcher = PagePrefetcher(client, site, prefetch)
+    try:
+        navigate_pages_http(prefetcher, sink, category_url, browser_fallback, checkpoint, incremental)
+    finally:
+        prefetcher.close()
+
+
+def navigate_pages_http(prefetcher, sink, category_url, browser_fallback=None, checkpoint=None, incremental=None):
+    client, site = prefetcher.client, prefetcher.site
+    page_count = 0
+    category_count = 0
+    body_type = None
+    url = category_url
+    seen_urls = set()
+
+    # Continue after the last page an interrupted run saved
+    progress = checkpoint.category_progress(category_url) if checkpoint else None
+    if progress and progress[1]:
+        page_count, last_page_url, _ = progress
+        print(f" >> Resuming category after page {page_count}...")
+        html, final_url = fetch_page(client, site, last_page_url, browser_fallback)
+        root = lxml.html.fromstring(html) if html is not None else None
+        headers = root.xpath(site.header_xpath) if root is not None else []
+        if headers:
+            body_type = site.category_name(element_text(headers[0]))
+            seen_urls.add(last_page_url)
+            url = site.next_page_url(root, final_url)
+        else:
+            print(" >> Could not reload the saved page, starting category over.")
+            page_count = 0
+
+    while url and url not in seen_urls:
+        seen_urls.add(url)
+        html, final_url = prefetcher.get(url, browser_fallback)
+        if html is None:
+            # Leave the category unfinished so the next run resumes it
+            print(f" >> Could not load {url}, stopping category.")
+            return
+        root = lxml.html.fromstring(html)
+        # Start on the next pages while this one is parsed and written
+        next_url = site.next_page_url(root, final_url)
+        prefetcher.schedule(next_url, root)
+
+        # Get body_type once at the start
+        if body_type is None:
+            headers = root.xpath(site.header_xpath)
+            if not headers:
+                print(" >> Error extracting body_type: no page header")
+                return
+            body_type = site.category_name(element_text(headers[0]))
+            print(f"Navigating in {page_title(root)}")
+
+        page_count += 1
+        with metrics.timer("extract"):
+            page_rows = site.page_rows(html, final_url, body_type)
+        print(f"Navigating page {page_count}: found {len(page_rows)} car listings.")
+        metrics.count("pages")
+        metrics.count("listings", len(page_rows))
+        if checkpoint and page_rows:
+            with metrics.timer("checkpoint"):
+                checkpoint.record_page(category_url, body_type, page_count, final_url, None, page_rows)
+        with metrics.timer("write"):
+            sink.write_rows(page_rows)
+        category_count += len(page_rows)
+
+        url = next_url
+
+        # Incremental crawl: the rest of the category was already scraped last run
+        if url and incremental and incremental.should_stop(body_type):
+            print(f" >> {incremental.stop_after_known_pages} pages of known listings in a row, "
+                  f"moving to the next category.")
+            break
+    else:
+        print("No link found. Must be last page of category.")
+        if incremental and body_type:
+            incremental.category_complete(body_type)
+
+    print(f"Scraped {category_count} {body_type} listings.")
+    if checkpoint and body_type:
+        checkpoint.finish_category(category_url)
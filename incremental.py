@@ -0,0 +1,180 @@
+"""Incremental re-crawls: stop paging once a category only shows listings we already have.
+
+Listings are matched by sites.listing_key: the site and the stable numeric id
+at the end of the listing URL (".../2013-nissan-sentra-13299512/"). The
+previous run's all_listings.csv (or its Parquet dataset, when the crawl only
+writes Parquet) is loaded into a key -> (price, mileage) index; while
+crawling, every page is checked against it and a category is abandoned
+after a few consecutive pages of nothing but known listings. The run then
+reports new, changed (price/mileage) and disappeared listings, and the
+snapshot CSVs are completed with the known rows that weren't re-scraped.
+"""
+import csv
+import glob
+import os
+
+from csv_output import FIELDNAMES
+from sites import listing_key
+
+
+def previous_snapshot_paths(data_dir):
+    aggregate = os.path.join(data_dir, "all_listings.csv")
+    if os.path.exists(aggregate):
+        return [aggregate]
+    return sorted(glob.glob(os.path.join(data_dir, "car_listings_*.csv")))
+
+
+def iter_snapshot_rows(paths):
+    for path in paths:
+        with open(path, newline="", encoding="utf-8") as csvfile:
+            yield from csv.DictReader(csvfile)
+
+
+class IncrementalTracker:
+    """Row sink wrapper that compares every scraped page with the previous snapshot.
+
+    Rows are passed straight on to the wrapped sink; new and changed listings
+    are also streamed to new_listings.csv and changed_listings.csv as they are
+    seen (pool workers pass write_reports=False and only use the stop rule).
+    navigate_category asks should_stop() before every "→" click.
+
+    output_format is the crawl's --format: with "parquet" the previous
+    snapshot is the Parquet dataset, otherwise the CSVs.
+    """
+
+    def __init__(self, sink, data_dir, stop_after_known_pages=2, write_reports=True, output_format="csv"):
+        self.sink = sink
+        self.data_dir = data_dir
+        self.stop_after_known_pages = stop_after_known_pages
+        self.output_format = output_format
+        self.snapshot_paths = previous_snapshot_paths(data_dir)
+        self.replaying = False
+
+        # id -> (price, mileage) of every listing in the previous snapshot
+        self.known = {}
+        for row in self.snapshot_rows():
+            car_id = listing_key(row["url"])
+            if car_id is not None:
+                self.known[car_id] = (row["price"], str(row["mileage"]))
+
+        self.seen = set()
+        self.known_page_streak = {}
+        self.complete_categories = set()
+        self.new_count = 0
+        self.changed_count = 0
+        self.disappeared_count = 0
+
+        self._reports = []
+        self._new_writer = self._changed_writer = None
+        if write_reports:
+            self._new_writer = self._open_report("new_listings.csv", FIELDNAMES)
+            self._changed_writer = self._open_report("changed_listings.csv",
+                                                     FIELDNAMES + ["old_price", "old_mileage"])
+
+    def snapshot_rows(self):
+        """The previous run's rows, from the output this crawl replaces."""
+        if self.output_format != "parquet":
+            yield from iter_snapshot_rows(self.snapshot_paths)
+            return
+        from parquet_output import DATASET_NAME, load_rows
+
+        if os.path.isdir(os.path.join(self.data_dir, DATASET_NAME)):
+            for batch in load_rows(self.data_dir):
+                yield from batch
+
+    def _open_report(self, filename, fieldnames):
+        csvfile = open(os.path.join(self.data_dir, filename), "w", newline="", encoding="utf-8")
+        self._reports.append(csvfile)
+        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        writer.writeheader()
+        return writer
+
+    @property
+    def total_rows(self):
+        return self.sink.total_rows
+
+    @property
+    def category_counts(self):
+        return self.sink.category_counts
+
+    def write_rows(self, rows):
+        if not rows:
+            return
+        all_known = True
+        for row in rows:
+            car_id = listing_key(row["url"])
+            if car_id is None:
+                all_known = False
+                continue
+            self.seen.add(car_id)
+            previous = self.known.get(car_id)
+            if previous is None:
+                all_known = False
+                self.new_count += 1
+                if self._new_writer:
+                    self._new_writer.writerow(row)
+            elif previous != (row["price"], str(row["mileage"])):
+                self.changed_count += 1
+                if self._changed_writer:
+                    self._changed_writer.writerow(dict(row, old_price=previous[0], old_mileage=previous[1]))
+
+        # Replayed checkpoint batches mix pages and categories, so only live pages count towards a streak
+        if not self.replaying:
+            body_type = rows[0]["body_type"]
+            streak = self.known_page_streak.get(body_type, 0)
+            self.known_page_streak[body_type] = streak + 1 if all_known else 0
+        self.sink.write_rows(rows)
+
+    def load_checkpoint(self, checkpoint):
+        """Replay the rows of an interrupted run (checkpoint.load_rows) without touching the page streaks."""
+        self.replaying = True
+        try:
+            return checkpoint.load_rows(self)
+        finally:
+            self.replaying = False
+
+    def should_stop(self, body_type):
+        """True once the category has shown enough consecutive pages of known listings."""
+        return self.known_page_streak.get(body_type, 0) >= self.stop_after_known_pages
+
+    def category_complete(self, body_type):
+        """Record that a category was crawled to its last page, so unseen ids really disappeared."""
+        self.complete_categories.add(body_type)
+
+    def finish(self, batch_size=1000):
+        """Carry unchanged known rows into the new snapshot and report disappeared listings.
+
+        Must run before the wrapped sink is closed, while the previous snapshot still exists.
+        """
+        disappeared_writer = self._open_report("disappeared_listings.csv", FIELDNAMES)
+        batch = []
+        for row in self.snapshot_rows():
+            car_id = listing_key(row["url"])
+            if car_id is not None and car_id in self.seen:
+                continue
+            if row["body_type"] in self.complete_categories:
+                # The whole category was crawled and this listing wasn't in it
+                self.disappeared_count += 1
+                disappeared_writer.writerow(row)
+                continue
+            batch.append(row)
+            if len(batch) >= batch_size:
+                self.sink.write_rows(batch)
+                batch = []
+        self.sink.write_rows(batch)
+        self._close_reports()
+        print(f"Incremental crawl: {self.new_count} new, {self.changed_count} changed, "
+              f"{self.disappeared_count} disappeared listings.")
+
+    def _close_reports(self):
+        for csvfile in self._reports:
+            csvfile.close()
+        self._reports = []
+
+    def close(self):
+        self._close_reports()
+        self.sink.close()
+
+    def abort(self):
+        self._close_reports()
+        self.sink.abort()
@@ -0,0 +1,171 @@
+"""Offline parsing of carpages.ca results pages.
+
+The crawler grabs the listing container's outerHTML once per page and every
+listing is read from that snapshot here, instead of issuing one WebDriver
+call per field. sites.CarpagesSite is the site adapter built on this module;
+the element helpers and the parse_* functions are shared by every site.
+"""
+
+def class_contains(fragment):
+    """XPath test matching CSS [class*='fragment'] (substring of the class attribute)."""
+    return f"contains(@class, '{fragment}')"
+
+
+def has_class(name):
+    """XPath test matching By.CLASS_NAME (a whole class token)."""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+# XPath equivalents of the CSS selectors used against the live page
+LISTING_CONTAINER_XPATH = f"//div[{class_contains('tw:laptop:col-span-8')}]"
+LISTING_XPATH = f".//div[{class_contains('tw:flex')}][{class_contains('tw:p-6')}]"
+PRICE_XPATH = f".//span[{class_contains('tw:font-bold tw:text-xl')}]"
+MILEAGE_HEADER_CLASS = "tw:col-span-full tw:mobile-lg:col-span-6 tw:laptop:col-span-4"
+MILEAGE_HEADER_XPATH = f".//div[{class_contains(MILEAGE_HEADER_CLASS)}]"
+MILEAGE_BOX_XPATH = f".//div[{class_contains('tw:text-gray-500')}]"
+MILEAGE_NUMBER_XPATH = f".//*[{has_class('number')}]"
+COLOR_XPATH = f".//span[{class_contains('tw:text-sm tw:font-bold')}]"
+
+
+# Titles to check for CAPTCHA or waiting pages (see SiteAdapter.is_blocked)
+SUSPICIOUS_TITLES = ["Just a moment", "Security Check", "Access denied", "Attention Required",
+                     "Checking your browser", "reCAPTCHA", "Cloudflare"]
+ACCURATE_TITLES = ["New and Used", "Carpages.ca"]
+
+
+def body_type_from_header(header_text):
+    """Turn a category page's h1 (e.g. "New and Used Sedans for Sale") into its body_type."""
+    if "New and Used" in header_text:
+        body_type = header_text.replace("New and Used ", "").replace(" for Sale", "")
+    else:
+        body_type = header_text
+    if body_type == "Cars":
+        body_type = "hybrid"
+    elif "Hatchbacks" in body_type:
+        body_type = "Hatchback"
+    elif "SUV" in body_type:
+        body_type = "SUV"
+    elif "Minivan" in body_type:
+        body_type = "Minivan"
+    else:
+        body_type = body_type[:-1]
+    return body_type
+
+
+def element_text(element):
+    """An element's text with every run of whitespace, newlines included, collapsed to one space and trimmed.
+
+    Close to WebElement.text for the one-line fields the parser reads, but not
+    identical: the browser keeps line breaks between blocks.
+    """
+    return " ".join(element.text_content().split())
+
+
+def find_first(element, xpath):
+    # Mirror find_element: a missing element is an error for the whole listing
+    found = element.xpath(xpath)
+    if not found:
+        raise ValueError(f"No element matching {xpath}")
+    return found[0]
+
+
+def listings_from_html(html, base_url=None):
+    """Parse a listing container (or a whole results page) and return its listing elements."""
+    # Imported here so the row helpers below (normalize_color, parse_price, ...) load without lxml
+    import lxml.html
+
+    root = lxml.html.fromstring(html)
+    if base_url:
+        # Resolve hrefs the same way get_attribute("href") does in the browser
+        root.make_links_absolute(base_url, resolve_base_href=False)
+    # A full page snapshot still has to be narrowed to the listing container
+    if not root.xpath(f"self::div[{class_contains('tw:laptop:col-span-8')}]"):
+        containers = root.xpath(LISTING_CONTAINER_XPATH)
+        if not containers:
+            return []
+        root = containers[0]
+    return root.xpath(LISTING_XPATH)
+
+
+def extract_data_from_listing(car_listing, body_type):
+    """Build the CSV row for one listing element."""
+    # Extract year, make, model, link and price
+    listing_header = element_text(find_first(car_listing, ".//h4"))
+    year = listing_header.split(" ")[0]
+    make = listing_header.split(" ")[1]
+    model = listing_header.split(" ")[2]
+    href_link = find_first(car_listing, ".//a").get("href")
+    price = element_text(find_first(car_listing, PRICE_XPATH))
+
+    # Extract mileage, check if mileage exists
+    mileage_header_box = find_first(car_listing, MILEAGE_HEADER_XPATH)
+    mileage_box = find_first(mileage_header_box, MILEAGE_BOX_XPATH)
+    raw_mileage = element_text(mileage_box)
+    car_mileage = 0
+
+    if "CALL" not in raw_mileage and raw_mileage.strip() != "":
+        # Extract only digits
+        mileage_number_list = mileage_box.xpath(MILEAGE_NUMBER_XPATH)
+        temp_mileage = ""
+        for num in mileage_number_list:
+            temp_mileage += element_text(num)
+
+        clean_mileage = temp_mileage.replace(",", "").strip()
+        if clean_mileage.isdigit():
+            car_mileage = int(clean_mileage)
+
+    color_raw = element_text(find_first(car_listing, COLOR_XPATH))
+    color = normalize_color(color_raw)
+
+    row = {
+        "year": year,
+        "make": make,
+        "model": model,
+        "price": price,
+        "mileage": car_mileage,
+        "color": color,
+        "url": href_link,
+        "body_type": body_type
+    }
+    return row
+
+
+def normalize_color(raw_color):
+    """Pick the basic color term already present in the descriptive color text."""
+    color_str = (raw_color or "").lower()
+    basic_colors = [
+        "black", "white", "red", "blue", "green", "yellow",
+        "orange", "purple", "pink", "brown", "beige", "gray",
+        "grey", "silver", "gold"
+    ]
+
+    for base in basic_colors:
+        if base in color_str:
+            # Normalize grey/gray to Gray
+            if base in ("gray", "grey"):
+                return "gray"
+            return base
+
+    return raw_color.split()[0].lower() if raw_color else "Other"
+
+
+def parse_price(price):
+    """Turn a display price like "$5,888" into whole dollars, or None when there is no number.
+
+    >>> parse_price("$27,729.10"), parse_price("$CALL"), parse_price("1.2.3")
+    (27729, None, None)
+    """
+    digits = "".join(ch for ch in str(price or "") if ch.isdigit() or ch == ".")
+    if not digits or digits == "." or digits.count(".") > 1:
+        return None
+    return int(float(digits))
+
+
+def parse_year(year):
+    year = str(year or "").strip()
+    return int(year) if year.isdigit() else None
+
+
+def parse_mileage(mileage):
+    mileage = str(mileage if mileage is not None else "").strip()
+    return int(mileage) if mileage.isdigit() else None
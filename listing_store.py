@@ -0,0 +1,164 @@
+"""In-memory, indexed listing store for the ReCarmend filter search.
+
+All car_listings_*.csv files are loaded once into a ListingTable and its
+columns are viewed as NumPy arrays: integer price/mileage/year and
+dictionary-coded make/model/color/body_type. Price,
+mileage and year get sorted indexes (range lookups via searchsorted) and the
+categorical columns get hash indexes (value -> row ids), so a filter search
+only touches the rows of its most selective filter.
+"""
+import glob
+import os
+
+import numpy as np
+
+from listing_table import ListingTable
+
+# Filter values recarmend.py uses for "not relevant"
+NO_FILTER_STRINGS = {"", "null", "none", "n/a", "any", "-1", "0"}
+
+
+def filter_number(value):
+    """Turn a recarmend.py numeric filter ("25000", "$25,000", -1, 0, "null") into an int or None."""
+    if value is None:
+        return None
+    digits = "".join(ch for ch in str(value) if ch.isdigit() or ch in ".-")
+    try:
+        number = int(float(digits))
+    except ValueError:
+        return None
+    return number if number > 0 else None
+
+
+def filter_text(value):
+    """Normalize a recarmend.py text filter; "Null"/"-1"/blank mean no filter."""
+    text = str(value or "").strip().lower()
+    return None if text in NO_FILTER_STRINGS else text
+
+
+class SortedIndex:
+    """Row ids ordered by a numeric column, for range lookups."""
+
+    def __init__(self, values, valid):
+        rows = np.flatnonzero(valid)
+        self.order = rows[np.argsort(values[rows], kind="stable")]
+        self.keys = values[self.order]
+
+    def range(self, low=None, high=None):
+        start = 0 if low is None else np.searchsorted(self.keys, low, side="left")
+        stop = len(self.keys) if high is None else np.searchsorted(self.keys, high, side="right")
+        return self.order[start:stop]
+
+
+class CategoryColumn:
+    """Dictionary-coded string column with a hash index from lowercased value to row ids."""
+
+    def __init__(self, codes, labels):
+        self.codes = np.asarray(codes, dtype=np.int32)
+        self.labels = [str(label) for label in labels]
+
+        # Case-insensitive lookups: several labels can share one key ("Red"/"red")
+        order = np.argsort(self.codes, kind="stable")
+        bounds = np.searchsorted(self.codes[order], np.arange(len(self.labels) + 1))
+        self.index = {}
+        for code, label in enumerate(self.labels):
+            rows = order[bounds[code]:bounds[code + 1]]
+            key = label.lower()
+            self.index[key] = np.concatenate([self.index[key], rows]) if key in self.index else rows
+
+    def rows(self, value):
+        return self.index.get(value, np.empty(0, dtype=np.intp))
+
+    def label(self, row):
+        return self.labels[self.codes[row]]
+
+
+class ListingStore:
+    """Array-backed listing table with the indexes the filter search needs."""
+
+    def __init__(self, rows):
+        # The table's integer columns already hold the parsed numbers (0 where there is none)
+        table = rows if isinstance(rows, ListingTable) else ListingTable(rows)
+        self.table = table
+        self.size = len(table)
+        self.year = np.frombuffer(table.numbers["year"], dtype=np.int32).astype(np.int16)
+        self.price = np.frombuffer(table.numbers["price"], dtype=np.int32).copy()
+        self.mileage = np.frombuffer(table.numbers["mileage"], dtype=np.int32).copy()
+        self.has_year = self.year > 0
+        self.has_price = self.price > 0
+        self.make, self.model, self.color, self.body_type = (
+            CategoryColumn(np.frombuffer(table.codes[name], dtype=np.uint32), table.labels[name])
+            for name in ("make", "model", "color", "body_type"))
+
+        self.price_index = SortedIndex(self.price, self.has_price)
+        self.mileage_index = SortedIndex(self.mileage, np.ones(self.size, dtype=bool))
+        self.year_index = SortedIndex(self.year, self.has_year)
+
+    @classmethod
+    def from_csv_dir(cls, data_dir, pattern="car_listings_*.csv"):
+        """Load every category CSV in data_dir."""
+        return cls(ListingTable.from_csv_files(sorted(glob.glob(os.path.join(data_dir, pattern)))))
+
+    def row(self, i):
+        return {
+            "year": int(self.year[i]),
+            "make": self.make.label(i),
+            "model": self.model.label(i),
+            "price": int(self.price[i]),
+            "mileage": int(self.mileage[i]),
+            "color": self.color.label(i),
+            "url": self.table.url(i),
+            "body_type": self.body_type.label(i),
+        }
+
+    def search(self, max_price=None, max_mileage=None, min_year=None, max_year=None,
+               color=None, make=None, model=None, car_type=None, limit=10):
+        """Return up to limit matching listings, cheapest first.
+
+        Takes the raw recarmend.py filter values; -1, 0 and "Null" mean "no filter".
+        """
+        max_price, max_mileage = filter_number(max_price), filter_number(max_mileage)
+        min_year, max_year = filter_number(min_year), filter_number(max_year)
+
+        candidates = []
+        if max_price is not None:
+            candidates.append(self.price_index.range(high=max_price))
+        if max_mileage is not None:
+            candidates.append(self.mileage_index.range(high=max_mileage))
+        if min_year is not None or max_year is not None:
+            candidates.append(self.year_index.range(min_year, max_year))
+        for column, value in ((self.make, make), (self.model, model),
+                              (self.color, color), (self.body_type, car_type)):
+            value = filter_text(value)
+            if value is not None:
+                candidates.append(column.rows(value))
+
+        if not candidates:
+            rows = np.arange(self.size)
+        else:
+            # Start from the most selective filter and check the rest against it
+            candidates.sort(key=len)
+            rows = candidates[0]
+            for other in candidates[1:]:
+                rows = rows[np.isin(rows, other, assume_unique=True)]
+                if not len(rows):
+                    break
+
+        # Cheapest first; listings without a price go last
+        sort_key = np.where(self.has_price[rows], self.price[rows], np.iinfo(np.int32).max)
+        if len(rows) > limit * 4:
+            top = np.argpartition(sort_key, limit * 4)[:limit * 4]
+            rows, sort_key = rows[top], sort_key[top]
+        rows = rows[np.argsort(sort_key, kind="stable")]
+
+        # The same car can be listed under more than one body_type
+        results, seen_urls = [], set()
+        for i in rows:
+            url = self.table.url(i)
+            if url in seen_urls:
+                continue
+            seen_urls.add(url)
+            results.append(self.row(i))
+            if len(results) >= limit:
+                break
+        return results
@@ -0,0 +1,175 @@
+"""Compact, column-oriented storage for scraped listing rows.
+
+A row dict costs several hundred bytes: the dict itself, eight key slots and
+a fresh string for every make, model, color and body_type even though a crawl
+only sees a few hundred distinct ones. ListingTable keeps rows as columns
+instead:
+
+    - year, price and mileage as machine integers in array.array columns
+      (the value ListingStore/normalize would parse, 0 when there is none)
+    - make, model, color and body_type as dictionary codes into one list of
+      labels per column
+    - every URL in one UTF-8 buffer with end offsets
+
+Rows still come out exactly as they went in. The few display values that an
+integer can't reproduce ("$CALL", "$27,729.10", a blank year, a number too
+big for the column) are kept as text in a small side table.
+
+A table is a row sink (write_rows), iterates as row dicts for code that
+wants them, pickles as a handful of byte buffers (pool workers send their
+rows to the parent this way) and hands its columns straight to the CSV
+writers (csv_records), normalize.normalize_table and ListingStore.
+"""
+import csv
+from array import array
+
+from csv_output import FIELDNAMES
+from listing_parser import parse_price
+
+CATEGORY_COLUMNS = ("make", "model", "color", "body_type")
+NUMERIC_COLUMNS = ("year", "price", "mileage")
+# What an array("i") column can hold
+INT_MIN, INT_MAX = -2 ** 31, 2 ** 31 - 1
+
+
+def whole_number(value):
+    """year/mileage rule: digits only (parse_year/parse_mileage), or None."""
+    text = str(value if value is not None else "").strip()
+    return int(text) if text.isdigit() else None
+
+
+def render_year(number):
+    return str(number)
+
+
+def render_price(number):
+    return f"${number:,}"
+
+
+def render_mileage(number):
+    return number  # The crawler writes mileage as an int
+
+
+NUMERIC_FORMATS = {
+    "year": (whole_number, render_year),
+    "price": (parse_price, render_price),
+    "mileage": (whole_number, render_mileage),
+}
+
+
+def column_number(name, value):
+    """The integer numeric column name stores for value, or None (no number, or too big for the column)."""
+    number = NUMERIC_FORMATS[name][0](value)
+    return number if number is not None and INT_MIN <= number <= INT_MAX else None
+
+
+class ListingTable:
+    def __init__(self, rows=()):
+        self.numbers = {name: array("i") for name in NUMERIC_COLUMNS}
+        self.codes = {name: array("I") for name in CATEGORY_COLUMNS}
+        self.labels = {name: [] for name in CATEGORY_COLUMNS}
+        self._label_codes = {name: {} for name in CATEGORY_COLUMNS}
+        self._urls = bytearray()
+        self._url_ends = array("I")
+        # column -> {row: display value the integer column can't reproduce}
+        self._text = {name: {} for name in NUMERIC_COLUMNS}
+        self.write_rows(rows)
+
+    def __len__(self):
+        return len(self._url_ends)
+
+    def __getstate__(self):
+        # The label -> code dicts are rebuilt from the labels on the other side
+        state = dict(self.__dict__)
+        del state["_label_codes"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._label_codes = {name: {label: code for code, label in enumerate(labels)}
+                             for name, labels in self.labels.items()}
+
+    def _code(self, name, value):
+        value = "" if value is None else str(value)
+        code = self._label_codes[name].get(value)
+        if code is None:
+            code = self._label_codes[name][value] = len(self.labels[name])
+            self.labels[name].append(value)
+        return code
+
+    def append(self, row):
+        """Add one row dict (csv_output.FIELDNAMES keys)."""
+        i = len(self)
+        for name in NUMERIC_COLUMNS:
+            value = row[name]
+            number = column_number(name, value)
+            self.numbers[name].append(number or 0)
+            if number is None or str(NUMERIC_FORMATS[name][1](number)) != str(value):
+                self._text[name][i] = "" if value is None else str(value)
+        for name in CATEGORY_COLUMNS:
+            self.codes[name].append(self._code(name, row[name]))
+        self._urls += (row["url"] or "").encode("utf-8")
+        self._url_ends.append(len(self._urls))
+
+    def write_rows(self, rows):
+        for row in rows:
+            self.append(row)
+
+    @classmethod
+    def from_csv_files(cls, paths):
+        table = cls()
+        for path in paths:
+            with open(path, newline="", encoding="utf-8") as csvfile:
+                table.write_rows(csv.DictReader(csvfile))
+        return table
+
+    def url(self, i):
+        start = self._url_ends[i - 1] if i else 0
+        return self._urls[start:self._url_ends[i]].decode("utf-8")
+
+    def value(self, name, i):
+        """Column value of row i, as it was written."""
+        if name in self.codes:
+            return self.labels[name][self.codes[name][i]]
+        if name == "url":
+            return self.url(i)
+        text = self._text[name]
+        return text[i] if i in text else NUMERIC_FORMATS[name][1](self.numbers[name][i])
+
+    def missing(self, name):
+        """Rows whose numeric column name has no number (the integer column holds 0 there)."""
+        return sorted(i for i, text in self._text[name].items() if column_number(name, text) is None)
+
+    def row(self, i):
+        return {name: self.value(name, i) for name in FIELDNAMES}
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.row(i)
+
+    def batches(self, size=1000):
+        """The rows as lists of row dicts, size at a time, for sinks that take dicts."""
+        for start in range(0, len(self), size):
+            yield [self.row(i) for i in range(start, min(start + size, len(self)))]
+
+    def column(self, name, rows=None):
+        """Values of one column for all rows (or the given row numbers), as they were written."""
+        rows = range(len(self)) if rows is None else rows
+        if name in self.codes:
+            labels, codes = self.labels[name], self.codes[name]
+            return [labels[codes[i]] for i in rows]
+        if name == "url":
+            return [self.url(i) for i in rows]
+        render, numbers, text = NUMERIC_FORMATS[name][1], self.numbers[name], self._text[name]
+        return [text[i] if i in text else render(numbers[i]) for i in rows]
+
+    def csv_records(self, rows=None):
+        """Rows (all, or the given row numbers) as tuples in FIELDNAMES order, for csv.writer."""
+        return zip(*(self.column(name, rows) for name in FIELDNAMES))
+
+    def rows_by(self, name):
+        """Row numbers grouped by the label of a category column, e.g. rows_by("body_type")."""
+        groups = {}
+        for i, code in enumerate(self.codes[name]):
+            groups.setdefault(code, []).append(i)
+        return {self.labels[name][code]: rows for code, rows in groups.items()}
@@ -0,0 +1,171 @@
+"""Vectorized normalization of scraped rows.
+
+Batch versions of normalize_color, parse_price, parse_year and parse_mileage
+from listing_parser that work on whole pandas columns at once. They give the
+same results as the per-row functions and are used wherever rows are handled
+in bulk (Parquet row groups, the ReCarmend listing store). NumPy and pandas
+are imported by the functions that use them, so `main.py normalize --help`
+doesn't wait for them. Run as a script to re-normalize existing CSVs:
+
+    python normalize.py ../data --output-dir ../data/normalized
+"""
+import argparse
+import glob
+import os
+
+from csv_output import FIELDNAMES
+
+# Same order as normalize_color: the first basic color found wins
+BASIC_COLORS = [
+    "black", "white", "red", "blue", "green", "yellow",
+    "orange", "purple", "pink", "brown", "beige", "gray",
+    "grey", "silver", "gold"
+]
+COLOR_NAMES = ["gray" if base in ("gray", "grey") else base for base in BASIC_COLORS] + [None]
+
+
+def factorize_text(values):
+    """Split a column into integer codes and its distinct values as an Arrow-backed string Series.
+
+    Scraped columns repeat heavily (a few hundred colors, a few thousand prices
+    across tens of thousands of rows), so every normalizer below works on the
+    distinct values only and broadcasts the result back with the codes.
+    """
+    import pandas as pd
+
+    with pd.option_context("future.no_silent_downcasting", True):
+        filled = pd.Series(values, dtype="object").fillna("")
+    codes, uniques = pd.factorize(filled, use_na_sentinel=False)
+    # Mileage arrives as int from the crawler and as text from CSVs
+    return codes, pd.Series([str(value) for value in uniques], dtype="string[pyarrow]")
+
+
+def normalize_colors(raw_colors):
+    """Vectorized normalize_color."""
+    import numpy as np
+    import pandas as pd
+
+    codes, raw = factorize_text(raw_colors)
+    lowered = raw.str.lower()
+
+    # Index of the first basic color found in each description (len(BASIC_COLORS) = none)
+    match = np.full(len(raw), len(BASIC_COLORS))
+    for i in range(len(BASIC_COLORS) - 1, -1, -1):
+        match[lowered.str.contains(BASIC_COLORS[i], regex=False).to_numpy(dtype=bool)] = i
+    normalized = np.array(COLOR_NAMES, dtype="object")[match]
+
+    # Fallback: first word of the description, or "Other" when there is none
+    rest = match == len(BASIC_COLORS)
+    if rest.any():
+        first_word = lowered[rest].str.extract(r"^\s*(\S+)", expand=False).fillna("Other")
+        normalized[rest] = first_word.to_numpy(dtype="object")
+    return pd.Series(normalized[codes], dtype="object")
+
+
+def parse_prices(prices):
+    """Vectorized parse_price: "$5,888" -> 5888, missing when there is no number."""
+    import numpy as np
+    import pandas as pd
+
+    codes, raw = factorize_text(prices)
+    numbers = pd.to_numeric(raw.str.replace(r"[^0-9.]", "", regex=True), errors="coerce")
+    return pd.Series(np.trunc(numbers.to_numpy(dtype="float64"))[codes]).astype("Int64")
+
+
+def parse_whole_numbers(values):
+    """Vectorized parse_year/parse_mileage: digits-only text -> int, anything else missing."""
+    import pandas as pd
+
+    codes, raw = factorize_text(values)
+    text = raw.str.strip()
+    numbers = pd.to_numeric(text.where(text.str.fullmatch(r"\d+").fillna(False)), errors="coerce")
+    return pd.Series(numbers.to_numpy(dtype="float64")[codes]).astype("Int64")
+
+
+def normalize_frame(frame, colors=True):
+    """Normalize a DataFrame in the CSV layout: typed year/price/mileage and basic colors.
+
+    Pass colors=False for rows whose color the crawler already normalized.
+    """
+    frame = frame.copy()
+    frame["year"] = parse_whole_numbers(frame["year"]).astype("Int16")
+    frame["price"] = parse_prices(frame["price"]).astype("Int32")
+    frame["mileage"] = parse_whole_numbers(frame["mileage"]).astype("Int32")
+    if colors:
+        frame["color"] = normalize_colors(frame["color"])
+    return frame
+
+
+def normalize_rows(rows, colors=True):
+    """Normalize a page (or any batch) of row dicts and return them as a DataFrame."""
+    import pandas as pd
+
+    return normalize_frame(pd.DataFrame(list(rows), columns=FIELDNAMES), colors=colors)
+
+
+def normalize_table(table, colors=False):
+    """normalize_frame for a ListingTable, built from its integer and coded columns without re-parsing.
+
+    The crawler normalizes colors already, so colors=True is only needed for older data.
+    """
+    import pandas as pd
+
+    frame = pd.DataFrame({
+        "year": integer_column(table, "year", "Int16"),
+        "make": coded_column(table, "make"),
+        "model": coded_column(table, "model"),
+        "price": integer_column(table, "price", "Int32"),
+        "mileage": integer_column(table, "mileage", "Int32"),
+        "color": coded_column(table, "color"),
+        "url": [table.url(i) for i in range(len(table))],
+        "body_type": coded_column(table, "body_type"),
+    })
+    if colors:
+        frame["color"] = normalize_colors(frame["color"])
+    return frame
+
+
+def integer_column(table, name, dtype):
+    import numpy as np
+    import pandas as pd
+
+    values = np.frombuffer(table.numbers[name], dtype=np.int32).astype(dtype.lower())
+    mask = np.zeros(len(values), dtype=bool)
+    mask[table.missing(name)] = True
+    return pd.arrays.IntegerArray(values, mask)
+
+
+def coded_column(table, name):
+    import numpy as np
+
+    codes = np.frombuffer(table.codes[name], dtype=np.uint32)
+    return np.array(table.labels[name], dtype="object")[codes] if len(codes) else np.empty(0, dtype="object")
+
+
+def normalize_csv_files(data_dir, output_dir, pattern="car_listings_*.csv"):
+    """Re-normalize every category CSV in data_dir into output_dir. Returns the rows written."""
+    import pandas as pd
+
+    os.makedirs(output_dir, exist_ok=True)
+    total = 0
+    for path in sorted(glob.glob(os.path.join(data_dir, pattern))):
+        frame = pd.read_csv(path, dtype=str, keep_default_na=False)
+        normalized = normalize_frame(frame)
+        normalized.to_csv(os.path.join(output_dir, os.path.basename(path)), index=False)
+        print(f"Normalized {len(normalized)} rows from {path}")
+        total += len(normalized)
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-normalize scraped car listing CSVs")
+    parser.add_argument("data_dir", nargs="?", default=".", help="folder with the car_listings_*.csv files")
+    parser.add_argument("--output-dir", help="where to write the normalized CSVs (default: DATA_DIR/normalized)")
+    args = parser.parse_args(argv)
+    output_dir = args.output_dir or os.path.join(args.data_dir, "normalized")
+    total = normalize_csv_files(args.data_dir, output_dir)
+    print(f"Wrote {total} normalized rows to {output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""Crawl pacing: per-host token-bucket rate limiting and DOM readiness waits.
+
+Requests are spaced by a token bucket per host instead of fixed sleeps, so
+the crawl goes as fast as the configured throughput allows and no faster.
+Browser waits resolve on in-page signals (a MutationObserver going quiet,
+or seeing the listing container replaced after a "→" click) rather than on
+hard-coded delays or WebDriver polling.
+"""
+import threading
+import time
+from urllib.parse import urlparse
+
+
+class TokenBucket:
+    """Allow `rate` acquisitions per second on average, with bursts of up to `burst`."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Take one token, sleeping only as long as needed for it to become available.
+
+        Returns the time spent waiting in seconds.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class RateLimiter:
+    """One token bucket per host."""
+
+    def __init__(self, rate=2.0, burst=2):
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def configure(self, rate, burst=None):
+        with self.lock:
+            self.rate = rate
+            self.burst = burst if burst is not None else max(1, int(rate))
+            self.buckets = {}
+
+    def wait(self, url):
+        """Block until another request to url's host is allowed. A rate of 0 disables limiting."""
+        if not self.rate:
+            return 0.0
+        host = urlparse(url).netloc
+        with self.lock:
+            bucket = self.buckets.get(host)
+            if bucket is None:
+                bucket = self.buckets[host] = TokenBucket(self.rate, self.burst)
+        return bucket.acquire()
+
+
+# Shared by every request the process makes, so the per-host budget holds across categories
+rate_limiter = RateLimiter()
+
+
+# Resolves once the watched element has had no DOM mutations for quiet_ms, or false on timeout
+DOM_QUIET_SCRIPT = """
+const [selector, quietMs, timeoutMs, done] = arguments;
+const target = (selector && document.querySelector(selector)) || document.documentElement;
+let quietTimer = null;
+let hardTimer = null;
+const observer = new MutationObserver(() => {
+    clearTimeout(quietTimer);
+    quietTimer = setTimeout(() => finish(true), quietMs);
+});
+function finish(result) {
+    observer.disconnect();
+    clearTimeout(quietTimer);
+    clearTimeout(hardTimer);
+    done(result);
+}
+observer.observe(target, {subtree: true, childList: true, attributes: true, characterData: true});
+quietTimer = setTimeout(() => finish(true), quietMs);
+hardTimer = setTimeout(() => finish(false), timeoutMs);
+"""
+
+
+def wait_for_dom_quiet(driver, selector=None, quiet_ms=300, timeout=5):
+    """Wait until the element matching selector (or the whole page) stops changing.
+
+    Returns True if the DOM settled and False if it was still changing at the timeout.
+    """
+    try:
+        return bool(driver.execute_async_script(DOM_QUIET_SCRIPT, selector, quiet_ms, int(timeout * 1000)))
+    except Exception:
+        # Page navigated away mid-wait or scripts are blocked; don't hold the crawl up
+        return False
+
+
+# Page turns. The listing container's HTML, the URL and the page indicator text, or null
+PAGE_SNAPSHOT_JS = """
+function pageSnapshot(containerSelector, indicatorSelector) {
+    const container = document.querySelector(containerSelector);
+    if (!container) {
+        return null;
+    }
+    const indicator = document.querySelector(indicatorSelector);
+    return {html: container.outerHTML, url: location.href, text: indicator ? indicator.innerText : null};
+}
+"""
+
+# Clicks the "next page" link (e.g. "→") with a MutationObserver armed, in one call. window.__pageTurn resolves with the next page's
+# snapshot as soon as the listing container is replaced (or the page indicator changes), or null at the
+# timeout. With wait the script hands that snapshot back itself; without, it returns right after the
+# click and AWAIT_PAGE_TURN_SCRIPT collects it. {last: true} when there is no enabled next link.
+PAGE_TURN_SCRIPT = PAGE_SNAPSHOT_JS + """
+const [containerSelector, indicatorSelector, nextText, timeoutMs, wait, done] = arguments;
+const next = Array.from(document.querySelectorAll("a")).find(link => link.textContent.trim() === nextText);
+if (!next || (next.getAttribute("class") || "").includes("disabled")) {
+    done({last: true});
+    return;
+}
+const indicatorText = () => {
+    const indicator = document.querySelector(indicatorSelector);
+    return indicator ? indicator.textContent : null;
+};
+const oldContainer = document.querySelector(containerSelector);
+const oldText = indicatorText();
+const oldIndicator = document.querySelector(indicatorSelector);
+const left = {url: location.href, text: oldIndicator ? oldIndicator.innerText : null};
+window.__pageTurn = new Promise(resolve => {
+    let timer = null;
+    const observer = new MutationObserver(check);
+    function check() {
+        const container = document.querySelector(containerSelector);
+        if (!container || (container === oldContainer && indicatorText() === oldText)) {
+            return;
+        }
+        observer.disconnect();
+        clearTimeout(timer);
+        resolve(Object.assign(pageSnapshot(containerSelector, indicatorSelector), {replaced: true}));
+    }
+    observer.observe(document.documentElement, {subtree: true, childList: true, characterData: true});
+    timer = setTimeout(() => { observer.disconnect(); resolve(null); }, timeoutMs);
+});
+next.click();
+if (wait) {
+    window.__pageTurn.then(page => { window.__pageTurn = null; done(Object.assign(left, {page: page})); });
+} else {
+    done(left);
+}
+"""
+
+# The snapshot PAGE_TURN_SCRIPT(wait=false) is waiting for. A next link that is a real link loads a new
+# document and the observer goes with the old one; then this waits for the new document's container.
+AWAIT_PAGE_TURN_SCRIPT = PAGE_SNAPSHOT_JS + """
+const [containerSelector, indicatorSelector, timeoutMs, done] = arguments;
+if (window.__pageTurn) {
+    const turn = window.__pageTurn;
+    window.__pageTurn = null;
+    turn.then(done);
+    return;
+}
+let timer = null;
+const observer = new MutationObserver(check);
+function check() {
+    if (document.readyState === "loading" || !document.querySelector(containerSelector)) {
+        return false;
+    }
+    observer.disconnect();
+    clearTimeout(timer);
+    document.removeEventListener("readystatechange", check);
+    done(pageSnapshot(containerSelector, indicatorSelector));
+    return true;
+}
+if (!check()) {
+    observer.observe(document.documentElement, {subtree: true, childList: true});
+    document.addEventListener("readystatechange", check);
+    timer = setTimeout(() => { observer.disconnect(); done(null); }, timeoutMs);
+}
+"""
+
+
+def turn_page(driver, container_selector, indicator_selector, next_text="→", timeout=7, wait=True):
+    """Click the next_text link and, with wait, bring the next page back in the same call.
+
+    Returns None on the last page. Otherwise a dict with the url and
+    indicator text of the page that was left and, with wait, "page": the
+    next page's snapshot ({"html", "url", "text"}) or None if nothing
+    changed within timeout. Without wait, finish_page_turn gets the page.
+    """
+    try:
+        turn = driver.execute_async_script(PAGE_TURN_SCRIPT, container_selector, indicator_selector, next_text,
+                                           int(timeout * 1000), wait)
+    except Exception:
+        if not wait:
+            raise
+        # The next link was a real link and the document unloaded under the wait; the new one has the page
+        return {"url": None, "text": None,
+                "page": finish_page_turn(driver, container_selector, indicator_selector, timeout)}
+    return None if turn.get("last") else turn
+
+
+def finish_page_turn(driver, container_selector, indicator_selector, timeout=7):
+    """The snapshot of the page turn_page(wait=False) clicked through to, or None at the timeout."""
+    for _ in range(2):
+        try:
+            return driver.execute_async_script(AWAIT_PAGE_TURN_SCRIPT, container_selector, indicator_selector,
+                                               int(timeout * 1000))
+        except Exception:
+            # The old document unloaded mid-wait; the second try runs in the new one
+            continue
+    return None
+
+
+def page_snapshot(driver, container_selector, indicator_selector):
+    """Snapshot of whatever page is on screen, or None if it has no listing container."""
+    try:
+        return driver.execute_script(PAGE_SNAPSHOT_JS + "return pageSnapshot(arguments[0], arguments[1]);",
+                                     container_selector, indicator_selector)
+    except Exception:
+        return None
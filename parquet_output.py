@@ -0,0 +1,137 @@
+"""Typed, columnar Parquet output for scraped listings.
+
+Rows are written to a hive-partitioned dataset (listings.parquet/body_type=Sedan/...)
+with price, mileage and year as integers and make/model/color dictionary
+encoded, so downstream loads don't have to re-parse display strings and
+readers can skip whole body_type partitions. The few prices an integer can't
+reproduce ("$CALL", "$27,729.10") keep their text in price_text, so
+load_rows gives back exactly what the crawler wrote.
+"""
+import os
+import shutil
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from csv_output import FIELDNAMES
+from listing_table import ListingTable, render_price
+from normalize import normalize_rows, normalize_table
+
+DATASET_NAME = "listings.parquet"
+
+# Same columns as the CSVs; body_type is the partition key so it isn't stored in the files
+SCHEMA = pa.schema([
+    ("year", pa.int16()),
+    ("make", pa.dictionary(pa.int32(), pa.string())),
+    ("model", pa.dictionary(pa.int32(), pa.string())),
+    ("price", pa.int32()),
+    ("mileage", pa.int32()),
+    ("color", pa.dictionary(pa.int32(), pa.string())),
+    ("url", pa.string()),
+    ("price_text", pa.string()),  # The displayed price where it isn't render_price(price), else null
+])
+
+
+def price_texts(texts, prices):
+    """The price_text column for displayed prices and their parsed integers."""
+    return [None if price is not pd.NA and render_price(int(price)) == str(text) else str(text or "")
+            for text, price in zip(texts, prices)]
+
+
+def rows_to_table(rows):
+    """Convert row dicts (CSV layout) or a ListingTable into an Arrow table with SCHEMA's types."""
+    if isinstance(rows, ListingTable):
+        frame, texts = normalize_table(rows), rows.column("price")
+    else:
+        rows = list(rows)
+        frame, texts = normalize_rows(rows, colors=False), [row["price"] for row in rows]
+    frame["price_text"] = price_texts(texts, frame["price"])
+    return pa.Table.from_pandas(frame[SCHEMA.names], schema=SCHEMA, preserve_index=False)
+
+
+def partition_dir(dataset_dir, body_type):
+    return os.path.join(dataset_dir, f"body_type={body_type}")
+
+
+class ParquetRowSink:
+    """Stream rows into a body_type-partitioned Parquet dataset.
+
+    Rows are buffered per body_type in a compact ListingTable and written out
+    as one row group every row_group_size rows, so memory stays bounded while
+    row groups stay large enough to compress well. Like CsvRowSink, the dataset
+    is built next to the real one and only swapped in by close().
+    """
+
+    def __init__(self, data_dir, row_group_size=5000, compression="zstd"):
+        self.dataset_dir = os.path.join(data_dir, DATASET_NAME)
+        self.part_dir = self.dataset_dir + ".part"
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self._buffers = {}
+        self._writers = {}
+        shutil.rmtree(self.part_dir, ignore_errors=True)
+
+    def write_rows(self, rows):
+        for row in rows:
+            buffer = self._buffers.get(row["body_type"])
+            if buffer is None:
+                buffer = self._buffers[row["body_type"]] = ListingTable()
+            buffer.append(row)
+            if len(buffer) >= self.row_group_size:
+                self._flush(row["body_type"])
+
+    def _flush(self, body_type):
+        buffer = self._buffers.get(body_type)
+        if not buffer:
+            return
+        writer = self._writers.get(body_type)
+        if writer is None:
+            directory = partition_dir(self.part_dir, body_type)
+            os.makedirs(directory, exist_ok=True)
+            writer = pq.ParquetWriter(os.path.join(directory, "part-0.parquet"), SCHEMA,
+                                      compression=self.compression)
+            self._writers[body_type] = writer
+        writer.write_table(rows_to_table(buffer))
+        self._buffers[body_type] = ListingTable()
+
+    def close(self):
+        """Write what is left and move the finished dataset into place."""
+        for body_type in list(self._buffers):
+            self._flush(body_type)
+        for writer in self._writers.values():
+            writer.close()
+        self._writers = {}
+        if os.path.isdir(self.part_dir):
+            shutil.rmtree(self.dataset_dir, ignore_errors=True)
+            os.replace(self.part_dir, self.dataset_dir)
+
+    def abort(self):
+        """Stop without replacing the existing dataset."""
+        for writer in self._writers.values():
+            writer.close()
+        self._writers = {}
+        self._buffers = {}
+
+
+def load_listings(data_dir, body_types=None, columns=None):
+    """Load the Parquet dataset as a DataFrame, reading only the requested body_type partitions."""
+    import pandas as pd
+
+    filters = [("body_type", "in", list(body_types))] if body_types else None
+    # Nullable dtypes keep price/year as integers even where a listing had no price
+    return pd.read_parquet(os.path.join(data_dir, DATASET_NAME), columns=columns, filters=filters,
+                           dtype_backend="numpy_nullable")
+
+
+def load_rows(data_dir, batch_size=5000):
+    """The dataset as batches of row dicts in the CSV layout, with prices displayed as the crawler wrote them."""
+    frame = load_listings(data_dir).astype("object")
+    frame = frame.where(frame.notna(), "")
+    # Datasets written before price_text existed only have the integers
+    texts = frame["price_text"] if "price_text" in frame else [""] * len(frame)
+    frame["price"] = [text if text != "" or price == "" else render_price(price)
+                      for text, price in zip(texts, frame["price"])]
+    frame = frame[FIELDNAMES]
+    for start in range(0, len(frame), batch_size):
+        yield frame.iloc[start:start + batch_size].to_dict("records")
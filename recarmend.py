@@ -6,11 +6,12 @@ Automatically generated by Colab.
 Original file is located at
     https://colab.research.google.com/drive/1MSaZ5iqZxeMYemp16GMHhwKpdmzSat9k
 """
+import asyncio
 import os
-import cohere
-import pandas as pd
 from dotenv import load_dotenv
 
+from ai_search import AsyncQueryParser, vocabulary_from_store
+
 #carData= pd.read_csv('/content/sample_data/ReCarmmend.csv')# make sure the csv is in the sample folder
 """
 csv's may be broken up by car type
@@ -19,67 +20,126 @@ csv's may be broken up by car type
 
 #carData = carData.sample(frac = 1).reset_index
 
-
-
-
-load_dotenv()
-
-co = cohere.ClientV2(os.getenv("CO_API_KEY"))
-inputType = 0
-
-maximumPrice = -1
-maximumMileage = -1
-color = 'Null'
-make = 'Null'
-model = 'Null'
-minYear = -1
-maxYear = 2026
-carType = 'Null'
-while inputType not in(1, 2):
-  inputType = int(input("filter search or AI search?(1/2): "))
-
-if(inputType == 1):
-  print("If these filters are not relevant to you please input -1")
-  maximumPrice = input("What is the max acceptable price: ")
-  maximumMileage = input("What is the max acceptable mileage: ")
-  minYear = input("What is the earliest year : ")
-  maxYear = input("What is the latest year (put the current year if this filter is not inportant to you): ")
-
-  print("If these filters are not relevant to you please input null")
-  color = input("What is the desired color: ")
-  make = input("What is the desired maker: ")
-  model = input("What is the desired model: ")
-  carType = input("What is the desired car type: ")#(Convertible, Coupe, Hatchback, Hybrid, Sedan, SUV, Minivan, Pickup Truck)
-  print(maximumPrice, maximumMileage, color, make, model, minYear, maxYear, carType)
-
-
-if(inputType == 2):
-  prompt = input("describe the kind of car you would want: ")
-  response = co.chat(
-        model="command-a-03-2025",
-        messages=[{"role": "user", "content": prompt + "Please take the prompt above and isolate the desired model, make, year range, maximum price, color, maximum mileage, and car type.If the prompt given does not relate to cars please ignore the prompt entirely and print nothing more than this prompt does not relate to cars.If An exact color is not specified please return it as null, a color should be given if it is a very general color ex(red orange yellow green blue, black, white, silver NOT matte black or platinum silver) if the given prompt does not include information for Color, Make or Model and car types please return it as 'null'.If multiple makes are given please select only 1. possible car types are Convertible, Coupe, Hatchback, Hybrid, Sedan, SUV, Minivan, Pickup Truck, if one of these is not specified please return null. If it does not include information for Maximum Price, MAximum Mileage, or Min/max year please return it as 0 Do not include any addition text.The current year is 2026. Please format the output as Maximum Price: Maximum Mileage: Car type: Color: Make: Model: Minimum Year: Maximum Year: "}]
-        )
-  rawText = response.message.content[0].text
-  parsed = {}
-  for line in rawText.split("\n"):
-    if ":" in line:
-      key,value = line.split(":", 1)
-      parsed[key.strip()] = value.strip()
-    maximumPrice = parsed.get("Maximum Price", 0)
-    maximumMileage = parsed.get("Maximum Mileage", 0)
-    color = parsed.get("Color", "Null")
-    make = parsed.get("Make", "Null")
-    model = parsed.get("Model", "Null")
-    minYear = parsed.get("Minimum Year", 0)
-    maxYear = parsed.get("Maximum Year", 0)
-    carType = parsed.get("Car type", "Null")
+#Scraped listings (car_listings_*.csv next to this file)
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+
+#The search filters and their "not relevant" values (recarmend_server.py takes the same names)
+NO_FILTERS = {
+  "maximumPrice": -1,
+  "maximumMileage": -1,
+  "minYear": -1,
+  "maxYear": 2026,
+  "color": "Null",
+  "make": "Null",
+  "model": "Null",
+  "carType": "Null",
+}
+
+#ai_search filter names -> ours
+PROMPT_FILTERS = {
+  "max_price": "maximumPrice",
+  "max_mileage": "maximumMileage",
+  "min_year": "minYear",
+  "max_year": "maxYear",
+  "color": "color",
+  "make": "make",
+  "model": "model",
+  "car_type": "carType",
+}
+
+def load_listings(data_dir=DATA_DIR, index_path=None):
+  """The listing store, its similarity index and a prompt parser that knows its makes and models.
+
+  The index is kept in index_path (default: similarity_index.npz in data_dir).
+  """
+  #Imported here so the questions come up before pandas and NumPy have loaded
+  from listing_store import ListingStore
+  from similarity import load_index
+
+  store = ListingStore.from_csv_dir(data_dir)
+  return store, load_index(data_dir, index_path), AsyncQueryParser(vocabulary_from_store(store))
+
+def filters_from_prompt(parsed):
+  filters = dict(NO_FILTERS)
+  for name, value in parsed.filters.items():
+    if value is not None:
+      filters[PROMPT_FILTERS[name]] = value
+  return filters
+
+def search_cars(store, filters, limit=10):
+  """Search the scraped listings with the filters above"""
+  return store.search(max_price=filters["maximumPrice"], max_mileage=filters["maximumMileage"],
+                      min_year=filters["minYear"], max_year=filters["maxYear"], color=filters["color"],
+                      make=filters["make"], model=filters["model"], car_type=filters["carType"], limit=limit)
+
+def close_matches(index, filters, results, k=5):
+  """Near misses: cars closest to what was asked for (a bit over budget, a year off, another trim...)"""
+  return index.similar({"price": filters["maximumPrice"], "mileage": filters["maximumMileage"],
+                        "year": filters["minYear"], "make": filters["make"], "model": filters["model"],
+                        "color": filters["color"], "body_type": filters["carType"]},
+                       k=k, exclude_urls=[car['url'] for car in results])
+
+def describe_car(car):
+  return f"{car['year']} {car['make']} {car['model']} - ${car['price']:,} - {car['mileage']:,} km - {car['color']} - {car['url']}"
+
+def main():
+  load_dotenv()
+
+  async def parse_prompt(queryParser, prompt):
+    try:
+      return await queryParser.parse(prompt)
+    finally:
+      await queryParser.aclose()
+
+  inputType = 0
+  filters = dict(NO_FILTERS)
+  while inputType not in(1, 2):
+    inputType = int(input("filter search or AI search?(1/2): "))
+
+  if(inputType == 1):
+    print("If these filters are not relevant to you please input -1")
+    filters["maximumPrice"] = input("What is the max acceptable price: ")
+    filters["maximumMileage"] = input("What is the max acceptable mileage: ")
+    filters["minYear"] = input("What is the earliest year : ")
+    filters["maxYear"] = input("What is the latest year (put the current year if this filter is not inportant to you): ")
+
+    print("If these filters are not relevant to you please input null")
+    filters["color"] = input("What is the desired color: ")
+    filters["make"] = input("What is the desired maker: ")
+    filters["model"] = input("What is the desired model: ")
+    filters["carType"] = input("What is the desired car type: ")#(Convertible, Coupe, Hatchback, Hybrid, Sedan, SUV, Minivan, Pickup Truck)
+    print(*filters.values())
+    store, similarityIndex, queryParser = load_listings()
+
+
+  if(inputType == 2):
+    prompt = input("describe the kind of car you would want: ")
+    store, similarityIndex, queryParser = load_listings()
+    #Simple prompts are understood locally; anything else is sent to the model
+    parsed = asyncio.run(parse_prompt(queryParser, prompt))
+    filters = filters_from_prompt(parsed)
     print("A.I. and our program may not always be able to understand the input given, if you see results that you do not desire we recommend searching with more explicity stated wants")
     print("If your prompt does not contain information about cars then you will simply see the first 10 cars listed in our database")
     print(" ")
     print("Based on your prompts this is the requirements the system is looking for")
-    print(rawText)
+    print(parsed.raw_text if parsed.raw_text else "\n".join(f"{name}: {value}" for name, value in parsed.filters.items()))
 
 
-  print(maximumPrice, maximumMileage, color, make, model, minYear, maxYear, carType)
+    print(*filters.values())
+
+  results = search_cars(store, filters)
+  print(" ")
+  if not results:
+    print("No cars in our database match these filters.")
+  for car in results:
+    print(describe_car(car))
+
+  closeMatches = close_matches(similarityIndex, filters, results)
+  if closeMatches:
+    print(" ")
+    print("Close matches:")
+  for car in closeMatches:
+    print(describe_car(car))
 
-#Wi ya webscraping goes here
\ No newline at end of file
+if __name__ == "__main__":
+  main()
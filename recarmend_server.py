@@ -0,0 +1,226 @@
+"""Long-lived ReCarmend query service.
+
+Loads the scraped listings, the similarity index and the prompt parser once
+and then answers searches, over HTTP or as JSON lines on stdin/stdout:
+
+    python recarmend_server.py --port 8080
+    curl -d '{"maximumPrice": 15000, "make": "Honda", "carType": "Sedan"}' http://127.0.0.1:8080/search
+    curl -d '{"prompt": "red civic under 12000"}' http://127.0.0.1:8080/search
+    curl http://127.0.0.1:8080/stats
+    python recarmend_server.py --stdio < searches.jsonl
+
+A request takes recarmend.py's filter fields (maximumPrice, maximumMileage,
+minYear, maxYear, color, make, model, carType; missing means "not
+relevant") and/or a "prompt" parsed like the AI search, with explicit fields
+winning over what the prompt says. "limit" and "closeMatches" set how many
+results and near misses come back; an "id" is echoed back, which is how
+stdin callers match answers to requests sent concurrently. Each answer
+carries its own latency; /stats has the percentiles since startup.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from collections import Counter, deque
+from http import HTTPStatus
+
+from dotenv import load_dotenv
+
+from recarmend import DATA_DIR, NO_FILTERS, close_matches, filters_from_prompt, load_listings, search_cars
+from telemetry import percentile
+
+REQUEST_OPTIONS = {"id", "prompt", "limit", "closeMatches"}
+MAX_LIMIT = 100
+LATENCY_WINDOW = 10000  # Latest requests kept for /stats
+
+
+def count_option(request, name, default):
+    """A request's limit/closeMatches: a whole number of at least 0, capped at MAX_LIMIT."""
+    try:
+        value = int(request.get(name, default))
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a whole number") from None
+    if value < 0:
+        raise ValueError(f"{name} must be 0 or more, not {value}")
+    return min(value, MAX_LIMIT)
+
+
+class RecarmendService:
+    def __init__(self, data_dir=DATA_DIR, index_path=None):
+        started = time.monotonic()
+        self.store, self.index, self.query_parser = load_listings(data_dir, index_path)
+        self.load_seconds = time.monotonic() - started
+        self.started = time.monotonic()
+        self.counts = Counter()
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    async def search(self, request):
+        """Answer one search request (a dict); raises ValueError for a malformed one."""
+        started = time.perf_counter()
+        unknown = set(request) - set(NO_FILTERS) - REQUEST_OPTIONS
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+        limit = count_option(request, "limit", 10)
+        close_limit = count_option(request, "closeMatches", 5)
+
+        filters, source = dict(NO_FILTERS), "filters"
+        if request.get("prompt"):
+            parsed = await self.query_parser.parse(str(request["prompt"]))
+            filters, source = filters_from_prompt(parsed), parsed.source
+        filters.update((name, request[name]) for name in NO_FILTERS if request.get(name) is not None)
+
+        # The array searches take milliseconds; keep them off the event loop anyway
+        results, near_misses = await asyncio.to_thread(self._search, filters, limit, close_limit)
+        latency = time.perf_counter() - started
+        self.counts["requests"] += 1
+        self.counts[source] += 1
+        self.latencies.append(latency)
+        answer = {"filters": filters, "source": source, "results": results, "closeMatches": near_misses,
+                  "latency_ms": round(latency * 1000, 3)}
+        if "id" in request:
+            answer["id"] = request["id"]
+        return answer
+
+    def _search(self, filters, limit, close_limit):
+        results = search_cars(self.store, filters, limit)
+        near_misses = close_matches(self.index, filters, results, close_limit) if close_limit > 0 else []
+        return results, near_misses
+
+    def stats(self):
+        latencies = list(self.latencies)
+        return {
+            "listings": self.store.size,
+            "load_seconds": round(self.load_seconds, 3),
+            "uptime_seconds": round(time.monotonic() - self.started, 1),
+            "counts": dict(self.counts),
+            "prompt_parser": dict(self.query_parser.stats),
+            "latency_ms": {
+                f"p{q}": round(percentile(latencies, q) * 1000, 3) for q in (50, 95, 99)
+            } if latencies else {},
+        }
+
+    async def answer(self, request):
+        """search() for callers that want an error answer instead of an exception."""
+        try:
+            if not isinstance(request, dict):
+                raise ValueError("A request is a JSON object")
+            return HTTPStatus.OK, await self.search(request)
+        except ValueError as e:
+            self.counts["errors"] += 1
+            return HTTPStatus.BAD_REQUEST, {"error": str(e)}
+        except Exception as e:
+            self.counts["errors"] += 1
+            print(f"Search failed: {e}", file=sys.stderr)
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(e)}
+
+    async def route(self, method, path, body):
+        path = path.split("?", 1)[0].rstrip("/")
+        if path == "/search" and method == "POST":
+            try:
+                request = json.loads(body or b"{}")
+            except ValueError:
+                return HTTPStatus.BAD_REQUEST, {"error": "Request body is not valid JSON"}
+            return await self.answer(request)
+        if path == "/stats" and method == "GET":
+            return HTTPStatus.OK, self.stats()
+        if path == "/health" and method == "GET":
+            return HTTPStatus.OK, {"status": "ok"}
+        return HTTPStatus.NOT_FOUND, {"error": f"No route for {method} {path or '/'}"}
+
+    async def handle_connection(self, reader, writer):
+        """Minimal HTTP/1.1 with keep-alive: JSON bodies with a Content-Length, nothing chunked."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, path, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                status, payload = await self.route(method, path, body)
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                data = json.dumps(payload).encode("utf-8")
+                writer.write(f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                             f"Content-Type: application/json\r\n"
+                             f"Content-Length: {len(data)}\r\n"
+                             f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass  # Client went away or sent something that isn't HTTP
+        finally:
+            writer.close()
+
+    async def serve_http(self, host, port):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(f"ReCarmend service: {self.store.size} listings loaded in {self.load_seconds:.2f}s, "
+              f"listening on http://{host}:{server.sockets[0].getsockname()[1]}", file=sys.stderr)
+        async with server:
+            await server.serve_forever()
+
+    async def serve_stdio(self):
+        """One JSON request per stdin line, answered as they finish (not in order) on stdout."""
+        tasks = set()
+
+        async def answer_line(line):
+            try:
+                status, payload = await self.answer(json.loads(line))
+            except ValueError:
+                status, payload = HTTPStatus.BAD_REQUEST, {"error": "Line is not valid JSON"}
+            payload["status"] = status.value
+            sys.stdout.write(json.dumps(payload) + "\n")
+            sys.stdout.flush()
+
+        while True:
+            line = await asyncio.to_thread(sys.stdin.readline)
+            if not line:
+                break
+            if line.strip():
+                task = asyncio.ensure_future(answer_line(line))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+
+    async def aclose(self):
+        await self.query_parser.aclose()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve ReCarmend searches from one long-lived process")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--stdio", action="store_true",
+                        help="read JSON requests from stdin and write the answers to stdout instead of HTTP")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="folder with the car_listings_*.csv files")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    service = RecarmendService(args.data_dir)
+
+    async def run():
+        try:
+            if args.stdio:
+                await service.serve_stdio()
+            else:
+                await service.serve_http(args.host, args.port)
+        finally:
+            await service.aclose()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
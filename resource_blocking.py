@@ -0,0 +1,56 @@
+"""Network-level blocking of the resources a crawl never looks at.
+
+Results pages pull in a photo per listing, web fonts and a stack of ad and
+analytics scripts, none of which end up in the CSVs. create_driver can block
+them with CDP Network.setBlockedURLs; each kind below can be allowed again
+with --allow-resources (e.g. images for solving a captcha by hand).
+"""
+import argparse
+
+# URL patterns per resource kind ("*" matches anything)
+RESOURCE_PATTERNS = {
+    "image": ["*.jpg*", "*.jpeg*", "*.png*", "*.gif*", "*.webp*", "*.avif*", "*.svg*"],
+    "font": ["*.woff*", "*.ttf*", "*.otf*", "*.eot*", "*fonts.googleapis.com*", "*fonts.gstatic.com*"],
+    "media": ["*.mp4*", "*.webm*", "*.m3u8*", "*.mp3*"],
+    "ads": [
+        "*doubleclick.net*", "*googlesyndication.com*", "*googleadservices.com*", "*adservice.google.*",
+        "*amazon-adsystem.com*", "*adnxs.com*", "*criteo.*", "*taboola.com*", "*outbrain.com*",
+        "*pubmatic.com*", "*rubiconproject.com*", "*openx.net*", "*moatads.com*",
+    ],
+    "trackers": [
+        "*google-analytics.com*", "*googletagmanager.com*", "*facebook.net*", "*hotjar.com*",
+        "*scorecardresearch.com*", "*quantserve.com*", "*nr-data.net*", "*clarity.ms*", "*bat.bing.com*",
+    ],
+}
+
+
+def resource_kinds(text):
+    """argparse type for a comma-separated list of RESOURCE_PATTERNS kinds."""
+    kinds = {kind.strip() for kind in text.split(",") if kind.strip()}
+    unknown = kinds - RESOURCE_PATTERNS.keys()
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown resource kind(s) {', '.join(sorted(unknown))}; "
+                                         f"choose from {', '.join(RESOURCE_PATTERNS)}")
+    return kinds
+
+
+def blocked_url_patterns(blocked_kinds):
+    patterns = []
+    for kind in RESOURCE_PATTERNS:
+        if kind in blocked_kinds:
+            patterns.extend(RESOURCE_PATTERNS[kind])
+    return patterns
+
+
+def block_resources(driver, blocked_kinds):
+    """Block the given resource kinds in the driver's current tab.
+
+    The block list belongs to the tab, so the commands are kept on the driver
+    for reset_driver_state to replay when it moves to a new tab.
+    """
+    patterns = blocked_url_patterns(blocked_kinds)
+    if not patterns:
+        return
+    driver.tab_cdp_commands = [("Network.enable", {}), ("Network.setBlockedURLs", {"urls": patterns})]
+    for command, args in driver.tab_cdp_commands:
+        driver.execute_cdp_cmd(command, args)
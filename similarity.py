@@ -0,0 +1,379 @@
+"""Nearest-neighbour search over the scraped listings ("cars like this one").
+
+ListingStore.search only returns exact filter matches, so a car a little
+over budget or of a neighbouring year disappears. This index ranks every
+listing by its distance to a query instead:
+
+    - year, log(price) and mileage, each divided by the difference that
+      counts as "noticeably different" (FEATURE_SCALES), in a float32 matrix
+    - make, model and color as dictionary codes and body_type as a bitmask
+      (the same car can be listed under several), in an int matrix. A
+      mismatch costs CATEGORY_WEIGHTS[name] ** 2, exactly what the
+      distance between one-hot columns would add, without materializing
+      hundreds of model columns.
+
+A query only counts the features it specifies, so a filter search ("Honda
+around $12,000") and a listing ("like this 2016 Civic") use the same code.
+Queries are answered in batches with a few array operations per feature and
+np.argpartition for the top k.
+
+The scaling is fixed rather than learned from the data, so new rows never
+change existing ones: refresh() reads only the bytes appended to each CSV
+since the last time and appends them to the matrices. The crawler writes a
+CSV by swapping in a new file, so refresh() also remembers which file it
+read (inode and a checksum of the last bytes it indexed) and rebuilds the
+index when a CSV was replaced or removed. The index is saved to
+similarity_index.npz, so the next run only parses what was added:
+
+    python similarity.py ../data https://www.carpages.ca/used-cars/...-13299512/ -k 5
+"""
+import argparse
+import csv
+import glob
+import io
+import json
+import os
+import zlib
+
+import numpy as np
+
+from listing_store import filter_number, filter_text
+from normalize import parse_prices, parse_whole_numbers
+
+INDEX_FILENAME = "similarity_index.npz"
+
+NUMERIC_FEATURES = ("year", "price", "mileage")
+CATEGORY_FEATURES = ("make", "model", "color", "body_type")
+
+# One unit of distance: 3 model years, a ~20% price difference, 30,000 km
+FEATURE_SCALES = {"year": 3.0, "price": 0.2, "mileage": 30000.0}
+# Cost of a mismatch, in the same units (squared when added to the distance)
+CATEGORY_WEIGHTS = {"make": 1.5, "model": 1.5, "color": 0.5, "body_type": 1.0}
+# Distance a listing without a price/year gets for that feature when the query sets it
+MISSING_PENALTY = 1.0
+# How much of the indexed part of a CSV is checksummed to recognize the file
+IDENTITY_BYTES = 4096
+
+UNKNOWN = -2  # Code of a query label the index has never seen (mismatches every row)
+ANY = -1  # Code of a feature the query doesn't specify
+
+
+def feature_values(years, prices, mileages):
+    """Scaled numeric features (NaN where missing) for parallel lists of raw CSV values."""
+    return scale_features(parse_whole_numbers(years).to_numpy(dtype=np.float64, na_value=np.nan),
+                          parse_prices(prices).to_numpy(dtype=np.float64, na_value=np.nan),
+                          parse_whole_numbers(mileages).to_numpy(dtype=np.float64, na_value=np.nan))
+
+
+def scale_features(year, price, mileage):
+    year, price, mileage = year.copy(), price.copy(), mileage.copy()
+    year[year <= 0] = np.nan
+    price[price <= 0] = np.nan
+    mileage[mileage < 0] = np.nan
+    return np.column_stack([
+        year / FEATURE_SCALES["year"],
+        np.log(price) / FEATURE_SCALES["price"],
+        mileage / FEATURE_SCALES["mileage"],
+    ]).astype(np.float32)
+
+
+class SimilarityIndex:
+    def __init__(self, path=None):
+        self.path = path
+        self.clear()
+        if path and os.path.exists(path):
+            self._load(path)
+
+    def clear(self):
+        self.size = 0
+        self.features = np.empty((0, len(NUMERIC_FEATURES)), dtype=np.float32)
+        self.codes = np.empty((0, len(CATEGORY_FEATURES) - 1), dtype=np.int32)
+        self.body_types = np.empty(0, dtype=np.uint64)
+        self.labels = {name: [] for name in CATEGORY_FEATURES}
+        self.urls = []
+        self.files = {}  # CSV path -> {"offset": bytes already indexed, "identity": file_identity()}
+        self._codes = {name: {} for name in CATEGORY_FEATURES}  # lowercased label -> code
+        self._rows = {}  # url -> row
+
+    def __len__(self):
+        return self.size
+
+    def _load(self, path):
+        with np.load(path) as saved:
+            self.features = saved["features"]
+            self.codes = saved["codes"]
+            self.body_types = saved["body_types"]
+            self.urls = [str(url) for url in saved["urls"]]
+            state = json.loads(str(saved["state"]))
+        self.size = len(self.urls)
+        self.labels = state["labels"]
+        self.files = state.get("files", {})
+        for name, labels in self.labels.items():
+            self._codes[name] = {label.lower(): code for code, label in enumerate(labels)}
+        self._rows = {url: row for row, url in enumerate(self.urls)}
+
+    def save(self, path=None):
+        path = path or self.path
+        if not path:
+            return
+        state = json.dumps({"labels": self.labels, "files": self.files})
+        part_path = path + ".part"
+        with open(part_path, "wb") as index_file:
+            np.savez(index_file, features=self.features[:self.size], codes=self.codes[:self.size],
+                     body_types=self.body_types[:self.size], urls=np.array(self.urls, dtype=str),
+                     state=np.array(state))
+        os.replace(part_path, path)
+
+    def _code(self, name, label, add=False):
+        key = str(label or "").strip().lower()
+        code = self._codes[name].get(key)
+        if code is None and add:
+            code = self._codes[name][key] = len(self.labels[name])
+            self.labels[name].append(str(label or "").strip())
+        return code
+
+    def _body_type_bit(self, body_type, add=False):
+        code = self._code("body_type", body_type, add)
+        if code is None:
+            return None
+        if code >= 64:
+            raise ValueError("More than 64 body_types; widen the body_type mask")
+        return np.uint64(1 << code)
+
+    def _reserve(self, count):
+        # Grow the matrices geometrically so appends stay cheap
+        needed = self.size + count
+        if needed <= len(self.features):
+            return
+        capacity = max(needed, 2 * len(self.features), 1024)
+        for name in ("features", "codes", "body_types"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def add_rows(self, rows):
+        """Index listing rows (csv_output.FIELDNAMES dicts); returns how many were new.
+
+        A car already indexed under another body_type only gains that body_type.
+        """
+        new_rows, extra_body_types = [], []
+        for row in rows:
+            existing = self._rows.get(row["url"])
+            if existing is not None:
+                extra_body_types.append((existing, self._body_type_bit(row["body_type"], add=True)))
+            elif row["url"]:
+                self._rows[row["url"]] = self.size + len(new_rows)
+                new_rows.append(row)
+
+        count = len(new_rows)
+        self._reserve(count)
+        stop = self.size + count
+        self.features[self.size:stop] = feature_values([r["year"] for r in new_rows],
+                                                       [r["price"] for r in new_rows],
+                                                       [r["mileage"] for r in new_rows])
+        for column, name in enumerate(CATEGORY_FEATURES[:-1]):
+            self.codes[self.size:stop, column] = [self._code(name, r[name], add=True) for r in new_rows]
+        self.body_types[self.size:stop] = [self._body_type_bit(r["body_type"], add=True) for r in new_rows]
+        for row, bit in extra_body_types:
+            self.body_types[row] |= bit
+        self.urls.extend(r["url"] for r in new_rows)
+        self.size = stop
+        return count
+
+    def refresh(self, data_dir, pattern="car_listings_*.csv"):
+        """Index the rows appended to the category CSVs since the last refresh; returns how many were new.
+
+        When a CSV was replaced (the crawler rewrites them whole) or removed,
+        or the index was saved without file identities, the whole index is
+        rebuilt.
+        """
+        paths = sorted(glob.glob(os.path.join(data_dir, pattern)))
+        if self.size and (set(self.files) - set(paths) or any(self._replaced(path) for path in paths)
+                          or not self.files):
+            print("The listings CSVs were rewritten, rebuilding the similarity index...")
+            self.clear()
+        added = 0
+        for path in paths:
+            offset = self.files[path]["offset"] if path in self.files else 0
+            rows, offset = read_new_rows(path, offset)
+            self.files[path] = {"offset": offset, "identity": file_identity(path, offset)}
+            added += self.add_rows(rows)
+        return added
+
+    def _replaced(self, path):
+        known = self.files.get(path)
+        if known is None:
+            return False
+        return os.path.getsize(path) < known["offset"] or file_identity(path, known["offset"]) != known["identity"]
+
+    def encode(self, queries):
+        """Turn queries into arrays: features, which features are set, codes and body_type masks.
+
+        A query holds any of year/price/mileage/make/model/color/body_type; like
+        the ReCarmend filters, -1, 0 and "Null" mean the feature doesn't matter.
+        """
+        numbers = np.array([[filter_number(query.get(name)) or np.nan for name in NUMERIC_FEATURES]
+                            for query in queries], dtype=np.float64).reshape(-1, len(NUMERIC_FEATURES))
+        features = scale_features(*numbers.T)
+        active = ~np.isnan(features)
+
+        codes = np.full((len(queries), len(CATEGORY_FEATURES) - 1), ANY, dtype=np.int32)
+        body_types = np.zeros(len(queries), dtype=np.uint64)
+        has_body_type = np.zeros(len(queries), dtype=bool)
+        for q, query in enumerate(queries):
+            for column, name in enumerate(CATEGORY_FEATURES[:-1]):
+                if filter_text(query.get(name)) is not None:
+                    code = self._code(name, query[name])
+                    codes[q, column] = UNKNOWN if code is None else code
+            # "Sedan/hybrid": any of them matches
+            for body_type in str(query.get("body_type") or "").split("/"):
+                if filter_text(body_type) is not None:
+                    has_body_type[q] = True
+                    bit = self._body_type_bit(body_type)
+                    if bit is not None:
+                        body_types[q] |= bit
+        return features, active, codes, body_types, has_body_type
+
+    def query_for_row(self, row):
+        """The query that finds listings like indexed row number row."""
+        query = self.row(row)
+        query["body_type"] = "/".join(query["body_types"])
+        return query
+
+    def distances(self, queries):
+        """Squared distances from each query to every indexed listing, as a (queries, listings) array."""
+        n = self.size
+        features, codes, body_types = self.features[:n], self.codes[:n], self.body_types[:n]
+        missing = np.isnan(features)
+        query_features, active, query_codes, query_body_types, has_body_type = self.encode(queries)
+
+        result = np.zeros((len(queries), n), dtype=np.float32)
+        for column in range(len(NUMERIC_FEATURES)):
+            if not active[:, column].any():
+                continue
+            diff = features[None, :, column] - query_features[:, column, None]
+            cost = np.where(missing[None, :, column], np.float32(MISSING_PENALTY), diff * diff)
+            result += np.where(active[:, column, None], cost, np.float32(0))
+        for column, name in enumerate(CATEGORY_FEATURES[:-1]):
+            if not (query_codes[:, column] != ANY).any():
+                continue
+            mismatch = (codes[None, :, column] != query_codes[:, column, None]) & (query_codes[:, column, None] != ANY)
+            result += mismatch * np.float32(CATEGORY_WEIGHTS[name] ** 2)
+        if has_body_type.any():
+            mismatch = ((body_types[None, :] & query_body_types[:, None]) == 0) & has_body_type[:, None]
+            result += mismatch * np.float32(CATEGORY_WEIGHTS["body_type"] ** 2)
+        return result
+
+    def nearest(self, queries, k=10, exclude=None, batch_size=256):
+        """Top-k (row, distance) lists for each query, closest first.
+
+        exclude is an optional list (one per query) of row collections to skip,
+        e.g. the listing a "like this one" query was made from.
+        """
+        results = []
+        for start in range(0, len(queries), batch_size):
+            batch = queries[start:start + batch_size]
+            distances = self.distances(batch)
+            if exclude is not None:
+                for q, rows in enumerate(exclude[start:start + batch_size]):
+                    distances[q, list(rows or ())] = np.inf
+            take = min(k, self.size)
+            if not take:
+                results.extend([] for _ in batch)
+                continue
+            top = np.argpartition(distances, take - 1, axis=1)[:, :take]
+            top_distances = np.take_along_axis(distances, top, axis=1)
+            order = np.argsort(top_distances, axis=1, kind="stable")
+            top = np.take_along_axis(top, order, axis=1)
+            top_distances = np.take_along_axis(top_distances, order, axis=1)
+            for rows, row_distances in zip(top, top_distances):
+                results.append([(int(row), float(np.sqrt(d))) for row, d in zip(rows, row_distances)
+                                if np.isfinite(d)])
+        return results
+
+    def similar(self, query, k=10, exclude_urls=()):
+        """Listings closest to one query, as row dicts with a "distance" key."""
+        exclude = [self._rows[url] for url in exclude_urls if url in self._rows]
+        return [dict(self.row(row), distance=round(distance, 3))
+                for row, distance in self.nearest([query], k, [exclude])[0]]
+
+    def similar_to_url(self, url, k=10):
+        """Listings most like the indexed listing at url."""
+        row = self._rows.get(url)
+        if row is None:
+            return []
+        return self.similar(self.query_for_row(row), k, exclude_urls=[url])
+
+    def row(self, i):
+        year, log_price, mileage = self.features[i] * [FEATURE_SCALES[name] for name in NUMERIC_FEATURES]
+        body_types = [name for bit, name in enumerate(self.labels["body_type"])
+                      if int(self.body_types[i]) >> bit & 1]
+        return {
+            "year": 0 if np.isnan(year) else int(round(year)),
+            "make": self.labels["make"][self.codes[i, 0]],
+            "model": self.labels["model"][self.codes[i, 1]],
+            "price": 0 if np.isnan(log_price) else int(round(np.exp(log_price))),
+            "mileage": 0 if np.isnan(mileage) else int(round(mileage)),
+            "color": self.labels["color"][self.codes[i, 2]],
+            "url": self.urls[i],
+            "body_type": body_types[0] if body_types else "",
+            "body_types": body_types,
+        }
+
+
+def read_new_rows(path, offset=0):
+    """Rows of a CSV after byte offset, and the offset to continue from next time.
+
+    A last line without its newline is still being written and is left for later.
+    """
+    with open(path, "rb") as csv_file:
+        header = csv_file.readline()
+        start = max(offset, csv_file.tell())
+        csv_file.seek(start)
+        data = csv_file.read()
+    end = data.rfind(b"\n") + 1
+    if not end:
+        return [], start
+    text = header.decode("utf-8-sig") + data[:end].decode("utf-8")
+    return list(csv.DictReader(io.StringIO(text, newline=""))), start + end
+
+
+def file_identity(path, offset):
+    """[inode, checksum of the IDENTITY_BYTES before offset]: changes when the file is replaced or rewritten."""
+    with open(path, "rb") as csv_file:
+        start = max(0, offset - IDENTITY_BYTES)
+        csv_file.seek(start)
+        tail = csv_file.read(offset - start)
+        return [os.fstat(csv_file.fileno()).st_ino, zlib.crc32(tail)]
+
+
+def load_index(data_dir, path=None):
+    """The saved similarity index for data_dir, brought up to date with its CSVs."""
+    index = SimilarityIndex(path or os.path.join(data_dir, INDEX_FILENAME))
+    added = index.refresh(data_dir)
+    if added:
+        index.save()
+    return index
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find listings similar to a listing URL")
+    parser.add_argument("data_dir", help="folder with the car_listings_*.csv files")
+    parser.add_argument("url", nargs="?", help="listing URL to find similar cars for")
+    parser.add_argument("-k", type=int, default=10, help="number of similar listings to show")
+    args = parser.parse_args(argv)
+
+    index = load_index(args.data_dir)
+    print(f"{len(index)} listings indexed.")
+    if args.url:
+        results = index.similar_to_url(args.url, args.k)
+        if not results:
+            print("That listing is not in the index.")
+        for car in results:
+            print(f"{car['distance']:>6.2f}  {car['year']} {car['make']} {car['model']} - ${car['price']:,} - "
+                  f"{car['mileage']:,} km - {car['color']} - {car['url']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""Site adapters: everything the crawl needs to know about one listing site.
+
+The crawl engines (the browser crawl and its worker pool in crawl.py, the
+HTTP crawl in http_engine.py) only talk to a SiteAdapter, and share one
+category scheduler, the per-host rate limiter, the checkpoint, the dedup
+index and the output sinks whatever site a page came from. An adapter
+covers:
+
+    - category discovery: the homepage and the links to each category
+    - pagination: the "next page" link, the ?page=N parameter the HTTP crawl
+      prefetches with, and the listing container and page indicator the
+      browser watches while it turns a page
+    - row extraction: the listings on a results page and the row of each
+    - captcha signature: the page titles of challenge/redirect pages
+    - listing identity: the id in a listing URL, and the key range the shared
+      stores (dedup index, incremental snapshot, history) file it under
+
+A new site is a SiteAdapter subclass with its selectors (and code only where
+its markup needs it), registered in SITES.
+"""
+import argparse
+import re
+from urllib.parse import urljoin, urlparse
+
+from listing_parser import (ACCURATE_TITLES, LISTING_CONTAINER_XPATH, LISTING_XPATH, SUSPICIOUS_TITLES,
+                            body_type_from_header, element_text, extract_data_from_listing, find_first,
+                            has_class, listings_from_html, normalize_color)
+
+LISTING_ID_RE = re.compile(r"-(\d+)/?$")  # ".../2013-nissan-sentra-13299512/"
+# Listing keys are key_space * KEY_SPACE + the site's listing id
+KEY_SPACE = 2 ** 40
+
+
+class SiteAdapter:
+    name = None
+    homepage_url = None
+
+    # Category discovery
+    category_links_css = None  # every category link on the homepage (browser)
+    category_links_xpath = None  # their hrefs (lxml)
+    header_css = "h1"  # a category page's title, which category_name turns into its body_type
+    header_xpath = "//h1"
+    cookie_button_xpath = None  # consent banner button, clicked once per browser
+
+    # Pagination
+    next_link_text = "→"
+    page_param = "page"  # results pages are ?page=N (None if they aren't)
+    listing_container_css = None  # the part of a results page that holds the listings
+    page_indicator_css = None  # text that changes with every page, e.g. "51-100"
+
+    # Row extraction, relative to the listing container / one listing
+    listing_container_xpath = None
+    listing_xpath = None
+    title_xpath = None  # "2019 Honda Civic LX": year, make and model
+    link_xpath = ".//a"
+    price_xpath = None
+    mileage_xpath = None
+    color_xpath = None
+
+    # Captcha signature: a challenge page's title has one of blocked_titles, or none of site_titles
+    blocked_titles = SUSPICIOUS_TITLES
+    site_titles = ()
+
+    # Listing identity. Every site needs its own key_space so equal ids of two sites never collide
+    listing_id_re = LISTING_ID_RE
+    key_space = None
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.name}>"
+
+    def is_blocked(self, title):
+        """True when the page title looks like a captcha/redirect page rather than the site."""
+        return any(t in title for t in self.blocked_titles) \
+            or bool(self.site_titles) and not any(t in title for t in self.site_titles)
+
+    def listing_id(self, url):
+        """The site's numeric id at the end of a listing URL, or None."""
+        match = self.listing_id_re.search(url or "")
+        return int(match.group(1)) if match else None
+
+    def listing_key(self, url):
+        """The listing's key in the shared stores: its id in this site's key_space, or None."""
+        listing = self.listing_id(url)
+        if listing is None or listing >= KEY_SPACE:
+            return None
+        return self.key_space * KEY_SPACE + listing
+
+    def category_urls(self, html, base_url=None):
+        import lxml.html
+
+        root = lxml.html.fromstring(html)
+        root.make_links_absolute(base_url or self.homepage_url, resolve_base_href=False)
+        # Remove duplicates
+        return list(dict.fromkeys(url for url in root.xpath(self.category_links_xpath) if url))
+
+    def category_name(self, header_text):
+        """The body_type of a category, from its page header."""
+        return header_text.strip()
+
+    def listings(self, html, base_url=None):
+        """Parse a listing container (or a whole results page) and return its listing elements."""
+        import lxml.html
+
+        root = lxml.html.fromstring(html)
+        if base_url:
+            root.make_links_absolute(base_url, resolve_base_href=False)
+        containers = root.xpath(self.listing_container_xpath)
+        return containers[0].xpath(self.listing_xpath) if containers else []
+
+    def extract_row(self, listing, body_type):
+        """Build the CSV row for one listing element."""
+        title = element_text(find_first(listing, self.title_xpath)).split(" ")
+        mileage = element_text(find_first(listing, self.mileage_xpath)) if self.mileage_xpath else ""
+        digits = "".join(ch for ch in mileage if ch.isdigit())
+        color = element_text(find_first(listing, self.color_xpath)) if self.color_xpath else ""
+        return {
+            "year": title[0],
+            "make": title[1] if len(title) > 1 else "",
+            "model": title[2] if len(title) > 2 else "",
+            "price": element_text(find_first(listing, self.price_xpath)),
+            "mileage": int(digits) if digits else 0,
+            "color": normalize_color(color),
+            "url": find_first(listing, self.link_xpath).get("href"),
+            "body_type": body_type,
+        }
+
+    def page_rows(self, html, base_url, body_type):
+        """The rows of a results page. A listing that can't be parsed is reported and skipped."""
+        rows = []
+        for listing in self.listings(html, base_url):
+            try:
+                rows.append(self.extract_row(listing, body_type))
+            except Exception as e:
+                print(f"(Skip listing because of error: {e})")
+        return rows
+
+    def next_page_url(self, root, current_url):
+        """Return the next page link's target, or None on the last page."""
+        for link in root.iter("a"):
+            if element_text(link) != self.next_link_text:
+                continue
+            if "disabled" in (link.get("class") or ""):
+                return None
+            href = link.get("href")
+            # AJAX-only pagers have no usable href to follow
+            if not href or href.startswith("#") or href.startswith("javascript"):
+                return None
+            return urljoin(current_url, href)
+        return None
+
+    def page_number(self, url):
+        """The match of ?page=N in url, or None."""
+        if not self.page_param:
+            return None
+        return re.search(rf"([?&]{re.escape(self.page_param)}=)(\d+)", url)
+
+    def highest_listed_page(self, root):
+        """Highest ?page=N the pager links to, or None."""
+        pages = [int(match.group(2)) for href in root.xpath("//a/@href") for match in [self.page_number(href)]
+                 if match]
+        return max(pages) if pages else None
+
+    def lookahead_urls(self, next_url, depth, last_page=None):
+        """next_url and the pages after it, as far as they can be predicted from its ?page=N."""
+        match = self.page_number(next_url)
+        if not match:
+            return [next_url]
+        page = int(match.group(2))
+        # Don't guess past the last page the pager shows
+        count = depth if last_page is None else max(1, min(depth, last_page - page + 1))
+        return [next_url[:match.start(2)] + str(page + i) + next_url[match.end(2):] for i in range(count)]
+
+
+class CarpagesSite(SiteAdapter):
+    """carpages.ca, parsed by listing_parser."""
+
+    name = "carpages"
+    homepage_url = "https://www.carpages.ca"
+
+    category_links_css = "div.category-jellybeans a"
+    category_links_xpath = f"//div[{has_class('category-jellybeans')}]//a/@href"
+    cookie_button_xpath = "//button[contains(., 'Consent')] | //div[contains(text(), 'Consent') and @role='button']"
+
+    listing_container_css = "div[class*='tw:laptop:col-span-8']"
+    page_indicator_css = "span[class*='tw:font-bold']"
+    listing_container_xpath = LISTING_CONTAINER_XPATH
+    listing_xpath = LISTING_XPATH
+
+    site_titles = ACCURATE_TITLES
+
+    key_space = 0  # Its keys are the plain listing ids, as in indexes and histories saved before adapters
+
+    def category_name(self, header_text):
+        return body_type_from_header(header_text)
+
+    def listings(self, html, base_url=None):
+        return listings_from_html(html, base_url)
+
+    def extract_row(self, listing, body_type):
+        # The mileage markup needs more than one selector
+        return extract_data_from_listing(listing, body_type)
+
+
+SITES = {site.name: site for site in (CarpagesSite(),)}
+DEFAULT_SITE = "carpages"
+SITE_HOSTS = {urlparse(site.homepage_url).netloc: site for site in SITES.values()}
+
+
+def listing_key(url):
+    """Key of a listing URL in the shared stores, from the adapter of the URL's host; None for other URLs."""
+    site = SITE_HOSTS.get(urlparse(url or "").netloc)
+    return site.listing_key(url) if site else None
+
+
+def site_names(text):
+    """argparse type for a comma-separated list of SITES names."""
+    names = list(dict.fromkeys(name.strip() for name in text.split(",") if name.strip()))
+    unknown = [name for name in names if name not in SITES]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown site(s) {', '.join(unknown)}; choose from {', '.join(SITES)}")
+    return names
+
+
+def schedule_categories(site_categories, finished=()):
+    """The crawl's category order: (site, category_url) jobs taken round-robin from each site.
+
+    site_categories is [(site, [category_url, ...]), ...]. Alternating sites
+    keeps consecutive categories on different hosts, so one host's rate
+    limit doesn't hold up the next category. Categories in finished (done by
+    an interrupted earlier run) are left out.
+    """
+    queues = [[(site, url) for url in urls if url not in finished] for site, urls in site_categories]
+    jobs = []
+    for i in range(max((len(queue) for queue in queues), default=0)):
+        jobs += [queue[i] for queue in queues if i < len(queue)]
+    return jobs
@@ -0,0 +1,173 @@
+"""Crawl telemetry: per-stage timers, counters and an end-of-run report.
+
+Every timed stage (driver startup, page loads, captcha waits, page turns,
+extraction, writes, ...) and every counter bump is appended as one JSON
+line to crawl_telemetry.jsonl, tagged with the category being crawled. At the
+end of the run the same numbers are summarized (pages/sec, listings/sec,
+p50/p95 per stage, resets and captcha stalls per category, a latency
+histogram for page turns and page loads), printed and saved to
+crawl_summary.json.
+"""
+import json
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+EVENTS_FILENAME = "crawl_telemetry.jsonl"
+SUMMARY_FILENAME = "crawl_summary.json"
+
+# Counters shown per category in the report
+CATEGORY_COUNTERS = ("pages", "listings", "browser_resets", "browser_restarts", "captcha_redirects",
+                     "captcha_stalls")
+
+# Stages whose latencies are also reported as a histogram, and its bucket upper bounds in seconds
+HISTOGRAM_STAGES = ("page_turn", "page_load")
+HISTOGRAM_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8)
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def histogram(values, buckets=HISTOGRAM_BUCKETS):
+    """How many values fall in each bucket, as {"<=0.1": n, ..., ">8": n}."""
+    counts = dict.fromkeys([f"<={bound}" for bound in buckets] + [f">{buckets[-1]}"], 0)
+    for value in values:
+        bound = next((bound for bound in buckets if value <= bound), None)
+        counts[f"<={bound}" if bound is not None else f">{buckets[-1]}"] += 1
+    return counts
+
+
+class Telemetry:
+    def __init__(self):
+        self.path = None
+        self.category = None
+        self.started = time.monotonic()
+        self.durations = defaultdict(list)
+        self.counters = Counter()
+        self.category_counters = defaultdict(Counter)
+        self._events = None
+        self._lock = threading.Lock()
+
+    def reset(self):
+        self.durations = defaultdict(list)
+        self.counters = Counter()
+        self.category_counters = defaultdict(Counter)
+        self.started = time.monotonic()
+
+    def open(self, path, append=False):
+        """Start writing events to path (pool workers append to the parent's file)."""
+        self.path = path
+        if not append:
+            # Truncate, then append like the workers: with O_APPEND every write lands at the current end
+            # of the file instead of this process's own offset, which would overwrite the workers' lines
+            open(path, "w").close()
+            self.started = time.monotonic()
+        self._events = open(path, "a", encoding="utf-8")
+
+    def event(self, name, **fields):
+        if self._events is None:
+            return
+        record = {"ts": round(time.time(), 3), "event": name, "pid": os.getpid(), "category": self.category}
+        record.update(fields)
+        line = json.dumps(record) + "\n"
+        with self._lock:
+            # One write per line so concurrent workers appending to the file don't interleave
+            self._events.write(line)
+            self._events.flush()
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            self.durations[stage].append(seconds)
+        self.event("timing", stage=stage, seconds=round(seconds, 4))
+
+    @contextmanager
+    def timer(self, stage):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.monotonic() - started)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+            if self.category:
+                self.category_counters[self.category][name] += n
+        self.event("count", counter=name, n=n)
+
+    def snapshot(self):
+        """Picklable copy of the numbers, for pool workers to hand back to the parent."""
+        return {
+            "durations": dict(self.durations),
+            "counters": dict(self.counters),
+            "category_counters": {category: dict(c) for category, c in self.category_counters.items()},
+        }
+
+    def merge(self, snapshot):
+        with self._lock:
+            for stage, values in snapshot["durations"].items():
+                self.durations[stage].extend(values)
+            self.counters.update(snapshot["counters"])
+            for category, counters in snapshot["category_counters"].items():
+                self.category_counters[category].update(counters)
+
+    def summary(self):
+        elapsed = time.monotonic() - self.started
+        return {
+            "elapsed_seconds": round(elapsed, 2),
+            "pages": self.counters["pages"],
+            "listings": self.counters["listings"],
+            "pages_per_second": round(self.counters["pages"] / elapsed, 3) if elapsed else 0.0,
+            "listings_per_second": round(self.counters["listings"] / elapsed, 3) if elapsed else 0.0,
+            "stages": {
+                stage: {
+                    "count": len(values),
+                    "total": round(sum(values), 3),
+                    "p50": round(percentile(values, 50), 4),
+                    "p95": round(percentile(values, 95), 4),
+                }
+                for stage, values in sorted(self.durations.items()) if values
+            },
+            "histograms": {
+                stage: histogram(self.durations[stage]) for stage in HISTOGRAM_STAGES if self.durations.get(stage)
+            },
+            "counters": dict(self.counters),
+            "categories": {
+                category: {name: counters[name] for name in CATEGORY_COUNTERS}
+                for category, counters in self.category_counters.items()
+            },
+        }
+
+    def report(self, summary_path=None):
+        """Print the run summary, save it as JSON and close the event log."""
+        summary = self.summary()
+        print(f"\nCrawl telemetry: {summary['pages']} pages, {summary['listings']} listings in "
+              f"{summary['elapsed_seconds']}s ({summary['pages_per_second']} pages/s, "
+              f"{summary['listings_per_second']} listings/s)")
+        for stage, stats in summary["stages"].items():
+            print(f"  {stage:<18} n={stats['count']:<6} p50={stats['p50']:.3f}s p95={stats['p95']:.3f}s "
+                  f"total={stats['total']:.1f}s")
+        for stage, counts in summary["histograms"].items():
+            print(f"  {stage + ' (s)':<18} " + "  ".join(f"{bucket}:{n}" for bucket, n in counts.items()))
+        for category, counters in summary["categories"].items():
+            print(f"  {category}: " + ", ".join(f"{name}={counters[name]}" for name in CATEGORY_COUNTERS))
+        if summary_path:
+            with open(summary_path, "w", encoding="utf-8") as summary_file:
+                json.dump(summary, summary_file, indent=2)
+        self.event("run_summary", **summary)
+        self.close()
+        return summary
+
+    def close(self):
+        if self._events is not None:
+            self._events.close()
+            self._events = None
+
+
+# Shared by everything the process times, like pacing.rate_limiter
+metrics = Telemetry()